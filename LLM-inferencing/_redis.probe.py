@@ -1,5 +1,6 @@
 import redis
 import json
+from redis_class import scan_keys
 
 def connect_to_redis(redis_host, redis_port, redis_password):
     try:
@@ -10,12 +11,9 @@ def connect_to_redis(redis_host, redis_port, redis_password):
         print(f"Failed to connect to Redis server: {e}")
         return None
 
-def probe_redis(r):
-    # Get all keys in Redis
-    keys = r.keys('*')
-
-    # Iterate over each key
-    for key in keys:
+def probe_redis(r, match='*'):
+    # Stream keys from Redis with SCAN and iterate over each key
+    for key in scan_keys(r, match=match):
         # Get the type of the key
         key_type = r.type(key)
         print(f"Key: {key}")
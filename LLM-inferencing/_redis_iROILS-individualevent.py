@@ -9,6 +9,8 @@ The function included is:
 reanalyze_summary: Reanalyzes a summary for a specific key stored in Redis by making a request to an API.
 To use the reanalyze_summary function, you need to provide the Redis connection object, the target key, model name, hostname, username, password, container name, API endpoint, and headers. The script demonstrates an example usage where a summary is reanalyzed for a specific key stored in Redis.
 
+Responses are served from the shared ResponseCache in redis_class.py when the same model, prompt and options were already run.
+
 Please note that you need to have the redis, requests, json, tqdm, and paramiko libraries installed in order to run this script.
 '''
 
@@ -18,6 +20,7 @@ import json
 import tqdm
 import time
 import paramiko
+from redis_class import ResponseCache, ContainerRecovery
 
 def connect_to_redis(redis_host, redis_port, redis_password):
     try:
@@ -27,7 +30,7 @@ def connect_to_redis(redis_host, redis_port, redis_password):
         print(f"Failed to connect to Redis server: {e}")
         return None
 
-def reanalyze_summary(r, target_key, model_name, hostname, username, password, container_name, api_endpoint, headers):
+def reanalyze_summary(r, target_key, model_name, hostname, username, password, container_name, api_endpoint, headers, cache=None):
     try:
         # Check if the key exists and has a narrative
         if r.exists(target_key) and r.hexists(target_key, 'Narrative'):
@@ -51,26 +54,35 @@ def reanalyze_summary(r, target_key, model_name, hostname, username, password, c
                     }
             }
 
-            # Make the request
-            response = requests.post(api_endpoint, headers=headers, data=json.dumps(data), timeout=45)
-            if response.status_code == 200:
+            # Serve the summary from the response cache, or make the request
+            summary = cache.get(model_name, prompt, data["options"]) if cache else None
+            if summary is None:
+                response = requests.post(api_endpoint, headers=headers, data=json.dumps(data), timeout=45)
+                if response.status_code != 200:
+                    # Print out detailed error information
+                    print(f'Failed to get a successful response for key {target_key}, status code: {response.status_code}')
+                    print(f'Response body: {response.text}')  # This will print the error message from the API if any
+                    return
                 parsed_json = response.json()
                 summary = parsed_json.get('response', '')
-                # Use the model name as part of the field name to store model-specific summaries
-                summary_field = f'{model_name}:LLM Summary'
-                r.hset(target_key, summary_field, summary)
-                print(f"Summary successfully reanalyzed for key: {target_key} using model: {model_name}.")
-                print("Completed Summary:")
-                print(summary)  # This will print the full summary to the console
-            else:
-                # Print out detailed error information
-                print(f'Failed to get a successful response for key {target_key}, status code: {response.status_code}')
-                print(f'Response body: {response.text}')  # This will print the error message from the API if any
+                if cache and summary:
+                    cache.set(model_name, prompt, data["options"], summary)
+
+            # Use the model name as part of the field name to store model-specific summaries
+            summary_field = f'{model_name}:LLM Summary'
+            r.hset(target_key, summary_field, summary)
+            print(f"Summary successfully reanalyzed for key: {target_key} using model: {model_name}.")
+            print("Completed Summary:")
+            print(summary)  # This will print the full summary to the console
         else:
             print(f'Key {target_key} does not exist or does not have a narrative.')
     except requests.exceptions.Timeout:
         print(f"Request timed out for key {target_key}. Attempting to restart the container...")
-        restart_container(hostname, username, password, container_name)
+        recovery = ContainerRecovery(hostname, username, password, container_name, api_endpoint)
+        try:
+            recovery.recover()
+        finally:
+            recovery.close()
         # Optionally, you can decide to retry the request here
 
 
@@ -91,4 +103,4 @@ model_name = 'mistral'
 redis_conn = connect_to_redis(redis_host, redis_port, redis_password)
 
 if redis_conn:
-    reanalyze_summary(redis_conn, target_key, model_name, hostname, username, password, container_name, api_endpoint, headers)
\ No newline at end of file
+    reanalyze_summary(redis_conn, target_key, model_name, hostname, username, password, container_name, api_endpoint, headers, cache=ResponseCache(redis_conn))
\ No newline at end of file
@@ -1,78 +1,383 @@
+import time
+
+# Measured from the top of the module so the reported startup includes the heavy imports
+_startup_began = time.perf_counter()
+
 import json
-from sklearn.cluster import KMeans
-from sklearn.feature_extraction.text import CountVectorizer
-from transformers import AutoTokenizer, AutoModel, pipeline
-
-# Load a pre-trained model and tokenizer from Hugging Face
-model_name = 'sentence-transformers/all-MiniLM-L6-v2'
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModel.from_pretrained(model_name)
-
-def fetch_data_from_redis(r):
-    keys = r.keys('*')
-    data = {}
-    for key in keys:
-        narrative = r.hget(key, 'Narrative')
-        summary = r.hget(key, f'{model_name}:LLM Summary')
-        data[key] = {'narrative': narrative, 'summary': summary}
-    return data
+import os
+import sys
+import hashlib
+import argparse
+import threading
+import traceback
+import configparser
+import redis
+import numpy as np
+import torch
+import joblib
+from concurrent.futures import ThreadPoolExecutor
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.feature_extraction.text import TfidfVectorizer
+from redis_class import RedisManager, scan_keys, batched
+from sparse_utils import top_k_per_row
+
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+# Embedding configuration
+embedding_batch_size = config.getint('Embedding', 'batch_size', fallback=32)
+embedding_max_length = config.getint('Embedding', 'max_length', fallback=256)
+embedding_workers = config.getint('Embedding', 'workers', fallback=1)
+embedding_threads = config.getint('Embedding', 'num_threads', fallback=0)
+embedding_store_path = config.get('Embedding', 'store_path', fallback='embeddings')
+
+# Clustering configuration
+num_clusters = config.getint('Clustering', 'num_clusters', fallback=5)
+cluster_batch_size = config.getint('Clustering', 'batch_size', fallback=1024)
+cluster_model_path = config.get('Clustering', 'model_path', fallback=os.path.join(embedding_store_path, 'kmeans.joblib'))
+redis_batch_size = config.getint('Redis', 'batch_size', fallback=100)
+
+# N-gram tagging configuration
+ngram_max = config.getint('Tagging', 'ngram_max', fallback=4)
+ngram_min_df = config.getint('Tagging', 'min_df', fallback=2)
+ngram_max_features = config.getint('Tagging', 'max_features', fallback=20000)
+ngram_top_k = config.getint('Tagging', 'top_k', fallback=5)
+NGRAM_VOCAB_KEY = 'ngram:vocab'
+
+# Named entity configuration; device -1 runs on the CPU
+ner_model_name = config.get('NER', 'model', fallback='dslim/bert-base-NER')
+ner_batch_size = config.getint('NER', 'batch_size', fallback=16)
+ner_aggregation = config.get('NER', 'aggregation_strategy', fallback='simple')
+ner_device = config.getint('NER', 'device', fallback=-1)
+NER_CACHE_KEY = f'ner:cache:{ner_model_name}'
+
+# Long-lived worker configuration
+analytics_jobs_key = config.get('Analytics', 'jobs_key', fallback='queue:analytics')
+analytics_block_seconds = config.getint('Analytics', 'block_seconds', fallback=5)
+analytics_warmup = config.getboolean('Analytics', 'warmup', fallback=True)
+
+model_name = config.get('Embedding', 'model', fallback='sentence-transformers/all-MiniLM-L6-v2')
+
+class ModelRegistry:
+    """Creates each model on first use and shares it across stages for the life of the process."""
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._lock = threading.Lock()
+        self.load_times = {}
+
+    def register(self, name, loader):
+        self._loaders[name] = loader
+
+    def get(self, name):
+        with self._lock:
+            if name not in self._models:
+                started = time.perf_counter()
+                self._models[name] = self._loaders[name]()
+                self.load_times[name] = time.perf_counter() - started
+                print(f"Loaded {name} model in {self.load_times[name]:.1f}s")
+            return self._models[name]
+
+    def warm_up(self):
+        # Load every model and push one tiny input through it so the first real job pays no setup cost
+        started = time.perf_counter()
+        embed_texts(['warm up'])
+        generate_tags(['Warm up'])
+        print(f"Warm-up finished in {time.perf_counter() - started:.1f}s")
+
+def _load_embedding_model():
+    # Load a pre-trained model and tokenizer from Hugging Face
+    from transformers import AutoTokenizer, AutoModel
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name)
+    model.eval()
+    return tokenizer, model
+
+def _load_ner_model():
+    from transformers import pipeline
+    return pipeline("ner", model=ner_model_name, aggregation_strategy=ner_aggregation, device=ner_device)
+
+models = ModelRegistry()
+models.register('embedding', _load_embedding_model)
+models.register('ner', _load_ner_model)
+
+def fetch_data_from_redis(r, summary_model_name):
+    # Yield events one at a time so memory stays flat on large instances
+    for key in scan_keys(r, match='event:*', key_type='hash'):
+        narrative, summary = r.hmget(key, ['Narrative', f'{summary_model_name}:LLM Summary'])
+        yield key, {'narrative': narrative or '', 'summary': summary or ''}
 
 # Generate N-grams
-def generate_ngrams(text, n=2):
-    vectorizer = CountVectorizer(ngram_range=(n, n))
-    ngrams = vectorizer.fit_transform([text]).todense().tolist()
-    return ngrams
+def generate_ngrams(texts, top_k=None):
+    """Tag the whole corpus in one sparse pass; returns the n-gram vocabulary and the top-k term ids per text."""
+    # Unigrams up to ngram_max-grams come out of a single tokenization of each text
+    vectorizer = TfidfVectorizer(ngram_range=(1, ngram_max), min_df=ngram_min_df, max_features=ngram_max_features,
+                                 stop_words='english', sublinear_tf=True)
+    tfidf = vectorizer.fit_transform(texts)
+    return vectorizer.get_feature_names_out(), top_k_per_row(tfidf, top_k or ngram_top_k)
+
+def store_ngram_vocabulary(r, vocabulary):
+    # Term ids are only meaningful against the vocabulary of the same run, so it is replaced atomically
+    pipe = r.pipeline(transaction=True)
+    pipe.delete(NGRAM_VOCAB_KEY)
+    for batch in batched(enumerate(vocabulary), redis_batch_size * 10):
+        pipe.hset(NGRAM_VOCAB_KEY, mapping={term_id: term for term_id, term in batch})
+    pipe.execute()
 
 # Generate embeddings using Hugging Face Transformers
-def generate_embeddings(text):
-    inputs = tokenizer(text, padding=True, truncation=True, return_tensors="pt")
-    outputs = model(**inputs)
-    # Use the mean of the last layer's features as the sentence embedding
-    embeddings = outputs.last_hidden_state.mean(dim=1).detach().numpy()
+def _tokenize_batch(texts):
+    # A fast tokenizer mutates its padding/truncation state on every call and raises "Already borrowed"
+    # when shared across threads, so batches are tokenized in the calling thread only
+    tokenizer, _ = models.get('embedding')
+    return tokenizer(texts, padding=True, truncation=True, max_length=embedding_max_length, return_tensors="pt")
+
+def _embed_batch(inputs):
+    _, model = models.get('embedding')
+    # inference_mode is thread-local, so it is entered inside each worker
+    with torch.inference_mode():
+        hidden = model(**inputs).last_hidden_state
+        # Use the mean of the last layer's features over the real (non-padding) tokens
+        mask = inputs['attention_mask'].unsqueeze(-1).to(hidden.dtype)
+        return ((hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)).numpy()
+
+def embed_texts(texts, batch_size=None, workers=None):
+    """Embed a list of texts and return one contiguous float32 matrix, row i belonging to texts[i]."""
+    batch_size = batch_size or embedding_batch_size
+    workers = workers or embedding_workers
+    if embedding_threads:
+        torch.set_num_threads(embedding_threads)
+
+    # Sort by length so each batch is padded only to its own longest text
+    order = np.argsort([len(text) for text in texts], kind='stable')
+    batches = [order[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+
+    _, model = models.get('embedding')
+    embeddings = np.empty((len(texts), model.config.hidden_size), dtype=np.float32)
+    # executor.map submits every batch up front, so all tokenization happens here and the pool only runs the model
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        inputs = (_tokenize_batch([texts[i] for i in indices]) for indices in batches)
+        for indices, vectors in zip(batches, executor.map(_embed_batch, inputs)):
+            embeddings[indices] = vectors
     return embeddings
 
+def generate_embeddings(text):
+    return embed_texts([text])
+
+class EmbeddingStore:
+    """Embeddings persisted as a float32 .npy matrix plus an index of event ids and text hashes.
+
+    Only events that are new or whose text changed are embedded again; the matrix is loaded
+    memory-mapped, so downstream stages read it without copying.
+    """
+
+    def __init__(self, path):
+        os.makedirs(path, exist_ok=True)
+        self.matrix_path = os.path.join(path, 'embeddings.npy')
+        self.index_path = os.path.join(path, 'embeddings_index.json')
+        self.ids, self.hashes = [], []
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                index = json.load(f)
+            self.ids, self.hashes = index['ids'], index['hashes']
+        # The index is written after the matrix, so the matrix may hold extra rows from an
+        # interrupted update (ignored by matrix()); fewer rows than ids means a damaged store,
+        # and the ids without a row are dropped so they are embedded again
+        stored_rows = len(self.matrix_rows())
+        if stored_rows < len(self.ids):
+            self.ids, self.hashes = self.ids[:stored_rows], self.hashes[:stored_rows]
+        self.rows = {event_id: row for row, event_id in enumerate(self.ids)}
+
+    @staticmethod
+    def text_hash(text):
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def matrix_rows(self):
+        # Every row in the file, including any not yet listed in the index
+        if not os.path.exists(self.matrix_path):
+            return np.empty((0, 0), dtype=np.float32)
+        return np.load(self.matrix_path, mmap_mode='r')
+
+    def matrix(self):
+        # Read-only memory map; row i belongs to self.ids[i]
+        return self.matrix_rows()[:len(self.ids)]
+
+    def update(self, ids, texts, embed_fn=None):
+        """Embed the new or changed texts and persist them; returns the ids that were embedded."""
+        embed_fn = embed_fn or embed_texts
+        hashes = [self.text_hash(text) for text in texts]
+        stale = [i for i, (event_id, text_hash) in enumerate(zip(ids, hashes)) if event_id not in self.rows or self.hashes[self.rows[event_id]] != text_hash]
+        if not stale:
+            return []
+
+        vectors = embed_fn([texts[i] for i in stale])
+        new = [(i, vector) for i, vector in zip(stale, vectors) if ids[i] not in self.rows]
+        changed = [(i, vector) for i, vector in zip(stale, vectors) if ids[i] in self.rows]
+
+        if new:
+            # Grow the matrix into a new file and swap it in, so a crash never leaves it half written;
+            # the new rows only count once the index below lists them
+            old_rows = len(self.ids)
+            tmp_path = self.matrix_path + '.tmp.npy'
+            grown = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(old_rows + len(new), vectors.shape[1]))
+            if old_rows:
+                grown[:old_rows] = self.matrix()
+            grown[old_rows:] = np.stack([vector for _, vector in new])
+            grown.flush()
+            del grown
+            os.replace(tmp_path, self.matrix_path)
+            for row, (i, _) in enumerate(new, old_rows):
+                self.ids.append(ids[i])
+                self.hashes.append(hashes[i])
+                self.rows[ids[i]] = row
+
+        if changed:
+            # Edited texts keep their row and are overwritten in place
+            matrix = np.load(self.matrix_path, mmap_mode='r+')
+            for i, vector in changed:
+                matrix[self.rows[ids[i]]] = vector
+                self.hashes[self.rows[ids[i]]] = hashes[i]
+            matrix.flush()
+            del matrix
+
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'ids': self.ids, 'hashes': self.hashes}, f)
+        os.replace(tmp_path, self.index_path)
+        return [ids[i] for i in stale]
+
 # Named Entity Recognition
-ner = pipeline("ner", model="dbmdz/bert-large-cased-finetuned-conll03-english", device=0)  # Example model
-def generate_tags(text):
-    tags = ner(text)
+def serialize_entities(entities):
+    # Compact "LABEL:word|LABEL:word" form, de-duplicated in order of appearance
+    tags = dict.fromkeys(f"{entity['entity_group']}:{entity['word'].replace('|', ' ').strip()}" for entity in entities)
+    return '|'.join(tags)
+
+def generate_tags(texts, r=None, batch_size=None):
+    """Tag a list of texts with named entities in length-sorted batches; returns one compact string per text.
+
+    With a Redis connection, results are cached in a hash keyed by text hash so unchanged texts are not re-run.
+    """
+    hashes = [hashlib.sha256(text.encode('utf-8')).hexdigest() for text in texts]
+    tags = [None] * len(texts)
+    if r is not None:
+        for start in range(0, len(hashes), redis_batch_size * 10):
+            chunk = hashes[start:start + redis_batch_size * 10]
+            tags[start:start + len(chunk)] = r.hmget(NER_CACHE_KEY, chunk)
+
+    # Sort the misses by length so each batch is padded only to its own longest text
+    missing = sorted((i for i, value in enumerate(tags) if value is None), key=lambda i: len(texts[i]))
+    if missing:
+        results = models.get('ner')([texts[i] for i in missing], batch_size=batch_size or ner_batch_size)
+        for i, entities in zip(missing, results):
+            tags[i] = serialize_entities(entities)
+        if r is not None:
+            for batch in batched(missing, redis_batch_size * 10):
+                r.hset(NER_CACHE_KEY, mapping={hashes[i]: tags[i] for i in batch})
+        print(f"Tagged {len(missing)} texts, {len(texts) - len(missing)} served from the entity cache.")
     return tags
 
-def cluster_embeddings(embeddings, num_clusters=5):
-    kmeans = KMeans(n_clusters=num_clusters)
-    kmeans.fit(embeddings)
-    labels = kmeans.labels_
-    return labels
-
-def store_results_to_redis(r, key, ngrams, tags, cluster_label):
-    # Clear existing fields if they exist
-    if r.hexists(key, 'Ngrams'):
-        r.hdel(key, 'Ngrams')
-    if r.hexists(key, 'Tags'):
-        r.hdel(key, 'Tags')
-    if r.hexists(key, 'Cluster'):
-        r.hdel(key, 'Cluster')
-    
-    # Set new values
-    r.hset(key, 'Ngrams', json.dumps(ngrams))
-    r.hset(key, 'Tags', json.dumps(tags))
-    r.hset(key, 'Cluster', cluster_label)
-
-
-if redis_conn:
-    data = fetch_data_from_redis(redis_conn)
-    for key, content in data.items():
-        narrative = content['narrative']
-        summary = content['summary']
-        
-        # Generate N-grams
-        ngrams = generate_ngrams(narrative + ' ' + summary)
-        
-        # Generate embeddings and cluster
-        embeddings = generate_embeddings(narrative + ' ' + summary)
-        cluster_label = cluster_embeddings(embeddings)
-        
-        # Generate tags
-        tags = generate_tags(narrative + ' ' + summary)
-        
-        # Store results back to Redis
-        store_results_to_redis(redis_conn, key, ngrams, tags, cluster_label)
+def cluster_embeddings(embeddings, num_clusters=num_clusters, model_path=cluster_model_path, new_rows=None):
+    """Cluster the whole embedding matrix in one pass and return a label per row.
+
+    Without a saved model (or when new_rows is None) MiniBatchKMeans is fitted over the full
+    matrix; otherwise the saved model is updated with partial_fit on the new rows only.
+    """
+    if new_rows is not None and os.path.exists(model_path):
+        kmeans = joblib.load(model_path)
+        if len(new_rows):
+            kmeans.partial_fit(embeddings[new_rows])
+    else:
+        kmeans = MiniBatchKMeans(n_clusters=num_clusters, batch_size=cluster_batch_size, n_init=3, random_state=42)
+        kmeans.fit(embeddings)
+    joblib.dump(kmeans, model_path)
+    return kmeans.predict(embeddings)
+
+def store_field_to_redis(r, keys, field, values):
+    # Write one field per event in pipelined batches
+    for batch in batched(zip(keys, values), redis_batch_size):
+        pipe = r.pipeline(transaction=False)
+        for key, value in batch:
+            pipe.hset(key, field, value)
+        pipe.execute()
+
+
+def main(r, summary_model_name):
+    events = list(fetch_data_from_redis(r, summary_model_name))
+    texts = [content['narrative'] + ' ' + content['summary'] for _, content in events]
+
+    # Embed only new or changed events, then read the whole corpus from the memory-mapped store
+    keys = [key for key, _ in events]
+    store = EmbeddingStore(embedding_store_path)
+    embedded = store.update(keys, texts)
+    print(f"Embedded {len(embedded)} new or changed events.")
+
+    # Cluster the corpus once; later runs only feed the newly embedded rows to partial_fit
+    labels = cluster_embeddings(store.matrix(), new_rows=sorted(store.rows[key] for key in embedded))
+    store_field_to_redis(r, keys, 'Cluster', (int(label) for label in labels[[store.rows[key] for key in keys]]))
+
+    # Tag the corpus with its top n-grams, stored as comma separated ids into the ngram:vocab hash
+    vocabulary, term_ids = generate_ngrams(texts)
+    store_ngram_vocabulary(r, vocabulary)
+    store_field_to_redis(r, keys, 'Ngrams', (','.join(map(str, ids)) for ids in term_ids))
+
+    # Named entities for the whole corpus, with cached texts skipped
+    store_field_to_redis(r, keys, 'Tags', generate_tags(texts, r))
+
+
+def run_worker(r, summary_model_name, warmup=analytics_warmup):
+    """Keep the models resident and run an analysis for every job pushed onto the jobs list.
+
+    A job is either empty or a JSON object; {"summary_model": "<name>"} overrides the summary field used.
+    """
+    if warmup:
+        models.warm_up()
+    print(f"Waiting for jobs on {analytics_jobs_key}")
+    while True:
+        try:
+            job = r.blpop(analytics_jobs_key, timeout=analytics_block_seconds)
+        except redis.exceptions.ConnectionError as e:
+            print(f"[Error] Lost the Redis connection while waiting for jobs: {e}. Retrying...")
+            time.sleep(analytics_block_seconds)
+            continue
+        if job is None:
+            continue
+        try:
+            options = json.loads(job[1]) if job[1] else {}
+        except json.JSONDecodeError:
+            print(f"[Warning] Ignoring malformed job: {job[1]!r}")
+            continue
+        started = time.perf_counter()
+        # A failing job is logged and the worker moves on, keeping its models resident
+        try:
+            main(r, options.get('summary_model', summary_model_name))
+        except Exception as e:
+            print(f"[Error] Job failed after {time.perf_counter() - started:.1f}s: {e}")
+            traceback.print_exc()
+            continue
+        print(f"[Success] Job finished in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Embed, cluster and tag the events stored in Redis.')
+    parser.add_argument('--worker', action='store_true', help=f'stay resident and run a job for each entry pushed to {analytics_jobs_key}')
+    parser.add_argument('--warmup', action=argparse.BooleanOptionalAction, default=None, help='load the models before the first job')
+    args = parser.parse_args()
+
+    manager = RedisManager()
+    # Constructing the client does not connect, so check the server before doing any work
+    try:
+        manager.redis_conn.ping()
+    except redis.exceptions.RedisError as e:
+        print(f"Failed to connect to Redis server: {e}")
+        sys.exit(1)
+    print(f"Started in {time.perf_counter() - _startup_began:.1f}s")
+
+    if args.worker:
+        try:
+            run_worker(manager.redis_conn, manager.summary_model_name, analytics_warmup if args.warmup is None else args.warmup)
+        except KeyboardInterrupt:
+            print("Worker stopped.")
+    else:
+        if args.warmup:
+            models.warm_up()
+        main(manager.redis_conn, manager.summary_model_name)
@@ -0,0 +1,22 @@
+'''
+Loads the running event list into Redis.
+
+Rows are streamed from the workbook in read-only mode and written to `event:<Event Number>` hashes in
+pipelined chunks. Rows whose content hash has not changed since the last load are skipped, so reloading
+the spreadsheet only rewrites new or edited events.
+
+Usage:
+    python ingest_events.py [path/to/extracted.xlsx]
+
+Without an argument the EXTRACTED_FILE_PATH from config.ini is loaded.
+'''
+
+import sys
+from redis_class import RedisManager
+
+if __name__ == '__main__':
+    manager = RedisManager()
+    if manager.redis_conn:
+        manager.ingest_events(sys.argv[1] if len(sys.argv) > 1 else None)
+    else:
+        print("Failed to connect to Redis server.")
@@ -13,6 +13,8 @@ The `config.ini` file should have the following structure:
 host = <redis_host>
 port = <redis_port>
 password = <redis_password>
+batch_size = <number of keys read or written per pipeline>
+scan_count = <SCAN COUNT hint used when iterating event keys>
 
 [Container]
 hostname = <hostname>
@@ -26,6 +28,38 @@ endpoint = <api_endpoint>
 [Model]
 name = <model_name>
 
+[Concurrency]
+max_in_flight = <number of generate requests kept in flight>
+request_timeout = <per-request deadline in seconds>
+
+[Queue]
+summary_stream = <stream holding events waiting for a summary>
+eval_stream = <stream holding events waiting for an evaluation>
+group = <consumer group shared by all workers>
+block_ms = <how long an idle worker blocks on XREADGROUP>
+claim_idle_ms = <idle time after which another worker's unacknowledged job is reclaimed>
+max_retries = <attempts per event before it is marked as failed>
+
+[Cache]
+enabled = <true to serve repeated generate requests from the response cache>
+ttl = <seconds a cached response is kept>
+max_entries = <number of responses kept in Redis before the oldest are evicted>
+memory_entries = <number of responses also kept in process memory>
+
+[Streaming]
+enabled = <true to consume the token stream instead of waiting for the full reply>
+budget = <wall-clock seconds per event before the partial output is kept as truncated>
+
+[Packing]
+size = <number of short narratives packed into one summary request, 0 to disable>
+max_chars = <narratives up to this length are eligible for packing>
+prompt = <summary prompt for a pack, with {count} and {events} placeholders>
+
+[Recovery]
+ready_timeout = <seconds to wait for the API to answer again after a restart>
+poll_interval = <initial delay between readiness probes, doubled up to max_backoff>
+max_backoff = <longest delay between readiness probes>
+
 Replace the placeholders with your actual values.
 
 Usage:
@@ -50,6 +84,195 @@ import paramiko
 import openpyxl
 import configparser
 import re
+import threading
+import uuid
+import hashlib
+import math
+import datetime
+import csv
+import os
+from collections import deque, OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from itertools import islice
+from urllib.parse import urlsplit
+
+
+def batched(iterable, size):
+    # Yield successive lists of at most `size` items from any iterable
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def scan_keys(r, match='event:*', count=1000, key_type=None):
+    # Stream matching keys with SCAN so Redis is never blocked by KEYS and the full key
+    # list is never held in memory; key_type optionally filters on the TYPE of each key
+    cursor = 0
+    while True:
+        cursor, keys = r.scan(cursor=cursor, match=match, count=count, _type=key_type)
+        yield from keys
+        if cursor == 0:
+            break
+
+
+# Text of a generate request plus its latency metrics; metrics are None for cache hits
+GenerationResult = namedtuple('GenerationResult', ['text', 'truncated', 'ttft', 'tokens_per_sec', 'elapsed'])
+
+
+class ResponseCache:
+    """Content-addressed cache of LLM responses keyed by model, rendered prompt and options.
+
+    Responses live in Redis under `<prefix>:<sha256>` with a TTL; a sorted set of last-use
+    times bounds the number of entries, and a small in-process LRU serves repeated hits
+    without a network round trip.
+    """
+
+    def __init__(self, redis_conn, ttl=604800, max_entries=50000, memory_entries=1024, prefix='llmcache'):
+        self.redis_conn = redis_conn
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.prefix = prefix
+        self.lru_key = f'{prefix}:lru'
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key_for(self, model_name, prompt, options):
+        payload = json.dumps([model_name, prompt, options], sort_keys=True)
+        return f'{self.prefix}:{hashlib.sha256(payload.encode()).hexdigest()}'
+
+    def get(self, model_name, prompt, options):
+        cache_key = self.key_for(model_name, prompt, options)
+        with self._lock:
+            entry = self._local.get(cache_key)
+            if entry and entry[0] > time.time():
+                self._local.move_to_end(cache_key)
+                return entry[1]
+
+        response = self.redis_conn.get(cache_key)
+        if response is not None:
+            self.redis_conn.zadd(self.lru_key, {cache_key: time.time()})
+            self._remember(cache_key, response)
+        return response
+
+    def set(self, model_name, prompt, options, response):
+        cache_key = self.key_for(model_name, prompt, options)
+        pipe = self.redis_conn.pipeline(transaction=False)
+        pipe.set(cache_key, response, ex=self.ttl)
+        pipe.zadd(self.lru_key, {cache_key: time.time()})
+        pipe.zcard(self.lru_key)
+        size = pipe.execute()[-1]
+
+        # Evict the least recently used responses once the cache grows past max_entries
+        if size > self.max_entries:
+            evicted = [member for member, _ in self.redis_conn.zpopmin(self.lru_key, size - self.max_entries)]
+            if evicted:
+                self.redis_conn.delete(*evicted)
+        self._remember(cache_key, response)
+
+    def _remember(self, cache_key, response):
+        with self._lock:
+            self._local[cache_key] = (time.time() + self.ttl, response)
+            self._local.move_to_end(cache_key)
+            while len(self._local) > self.memory_entries:
+                self._local.popitem(last=False)
+
+
+class ContainerRecovery:
+    """Restart the inference container over a reused SSH connection and wait until it serves again.
+
+    While a recovery is running the `available` event is cleared, which acts as a circuit
+    breaker: request senders block on wait_available() instead of piling up more timeouts.
+    """
+
+    def __init__(self, hostname, username, password, container_name, api_endpoint, ready_timeout=180, poll_interval=1, max_backoff=10):
+        self.hostname = hostname
+        self.username = username
+        self.password = password
+        self.container_name = container_name
+        endpoint = urlsplit(api_endpoint)
+        self.probe_url = f'{endpoint.scheme}://{endpoint.netloc}/api/tags'
+        self.ready_timeout = ready_timeout
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+
+        self.available = threading.Event()
+        self.available.set()
+        self.recovered_at = None
+        self._lock = threading.Lock()
+        self._ssh = None
+
+    def _connection(self):
+        # Reuse the SSH session across recoveries and reconnect only when it has dropped
+        transport = self._ssh.get_transport() if self._ssh else None
+        if transport is None or not transport.is_active():
+            self._ssh = paramiko.SSHClient()
+            self._ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            self._ssh.connect(self.hostname, username=self.username, password=self.password)
+        return self._ssh
+
+    def run(self, action):
+        stdin, stdout, stderr = self._connection().exec_command(f'docker {action} {self.container_name}')
+        output = stdout.read().decode()
+        error = stderr.read().decode()
+        if output:
+            print(output)
+        if error:
+            print(error)
+
+    def is_ready(self):
+        try:
+            return requests.get(self.probe_url, timeout=5).status_code == 200
+        except requests.exceptions.RequestException:
+            return False
+
+    def wait_until_ready(self):
+        # Poll the API with exponential backoff instead of sleeping for a fixed time
+        deadline = time.monotonic() + self.ready_timeout
+        delay = self.poll_interval
+        while time.monotonic() < deadline:
+            if self.is_ready():
+                return True
+            time.sleep(min(delay, max(0, deadline - time.monotonic())))
+            delay = min(delay * 2, self.max_backoff)
+        return self.is_ready()
+
+    def wait_available(self):
+        self.available.wait()
+
+    def recover(self, since=None):
+        """Restart the container unless a recovery already finished after `since` (a monotonic time)."""
+        with self._lock:
+            if since is not None and self.recovered_at is not None and self.recovered_at >= since:
+                return True
+
+            self.available.clear()
+            start = time.monotonic()
+            ready = False
+            try:
+                print(f"Restarting container '{self.container_name}'...")
+                self.run('restart')
+                ready = self.wait_until_ready()
+            except Exception as e:
+                print(f"Failed to restart container '{self.container_name}': {e}")
+            finally:
+                self.recovered_at = time.monotonic()
+                self.available.set()
+
+            if ready:
+                print(f"Container '{self.container_name}' is serving again after {self.recovered_at - start:.1f}s.")
+            else:
+                print(f"[Error] Container '{self.container_name}' did not become ready within {self.ready_timeout}s.")
+            return ready
+
+    def close(self):
+        if self._ssh:
+            self._ssh.close()
+            self._ssh = None
+
 
 class RedisManager:
     def __init__(self):
@@ -63,6 +286,8 @@ class RedisManager:
         self.redis_host = config.get('Redis', 'host')
         self.redis_port = config.getint('Redis', 'port')
         self.redis_password = config.get('Redis', 'password') or None
+        self.batch_size = config.getint('Redis', 'batch_size', fallback=100)
+        self.scan_count = config.getint('Redis', 'scan_count', fallback=1000)
 
         # Get the API endpoint from the configuration file
         self.api_endpoint = config.get('API', 'endpoint')
@@ -103,6 +328,7 @@ class RedisManager:
         # Spreadsheet configuration
         self.file_path = config.get('SPREADSHEET', 'FILE_PATH')
         self.extracted_file_path = config.get('SPREADSHEET', 'EXTRACTED_FILE_PATH')
+        self.key_column = config.get('SPREADSHEET', 'KEY_COLUMN', fallback='Event Number')
 
         # Container configuration
         self.hostname = config.get('Container', 'hostname')
@@ -110,54 +336,175 @@ class RedisManager:
         self.password = config.get('Container', 'password')
         self.container_name = config.get('Container', 'name')
 
+        # Concurrency configuration
+        self.max_in_flight = config.getint('Concurrency', 'max_in_flight', fallback=1)
+        self.request_timeout = config.getfloat('Concurrency', 'request_timeout', fallback=45)
+
+        # Work queue configuration
+        self.summary_stream = config.get('Queue', 'summary_stream', fallback='queue:summaries')
+        self.eval_stream = config.get('Queue', 'eval_stream', fallback='queue:evaluations')
+        self.queue_group = config.get('Queue', 'group', fallback='iroils')
+        self.queue_block_ms = config.getint('Queue', 'block_ms', fallback=5000)
+        self.queue_claim_idle_ms = config.getint('Queue', 'claim_idle_ms', fallback=300000)
+        self.max_retries = config.getint('Queue', 'max_retries', fallback=3)
+
+        # Response cache configuration
+        self.cache_enabled = config.getboolean('Cache', 'enabled', fallback=True)
+        self.cache_ttl = config.getint('Cache', 'ttl', fallback=604800)
+        self.cache_max_entries = config.getint('Cache', 'max_entries', fallback=50000)
+        self.cache_memory_entries = config.getint('Cache', 'memory_entries', fallback=1024)
+
+        # Streaming configuration
+        self.stream_enabled = config.getboolean('Streaming', 'enabled', fallback=False)
+        self.stream_budget = config.getfloat('Streaming', 'budget', fallback=120)
+
+        # Multi-event prompt packing configuration
+        self.pack_size = config.getint('Packing', 'size', fallback=0)
+        self.pack_max_chars = config.getint('Packing', 'max_chars', fallback=400)
+        self.pack_prompt = config.get('Packing', 'prompt', fallback=None)
+
+        # Container recovery
+        self.recovery = ContainerRecovery(
+            self.hostname, self.username, self.password, self.container_name, self.api_endpoint,
+            ready_timeout=config.getfloat('Recovery', 'ready_timeout', fallback=180),
+            poll_interval=config.getfloat('Recovery', 'poll_interval', fallback=1),
+            max_backoff=config.getfloat('Recovery', 'max_backoff', fallback=10)
+        )
 
         try:
             self.redis_conn = redis.StrictRedis(host=self.redis_host, port=self.redis_port, password=self.redis_password, decode_responses=True)
         except Exception as e:
             print(f"Failed to connect to Redis server: {e}")
 
-    @staticmethod
-    def manage_container(hostname, username, password, container_name, action):
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(hostname, username=username, password=password)
+        self.response_cache = ResponseCache(self.redis_conn, ttl=self.cache_ttl, max_entries=self.cache_max_entries, memory_entries=self.cache_memory_entries) if self.cache_enabled else None
 
-        command = f'docker {action} {container_name}'
-        try:
-            stdin, stdout, stderr = ssh.exec_command(command)
-            output = stdout.read().decode()
-            error = stderr.read().decode()
-            if output:
-                print(output)
-            if error:
-                print(error)
-        finally:
-            ssh.close()
+    def restart_container(self, since=None):
+        # Requests that were sent before the last recovery finished do not restart it again
+        return self.recovery.recover(since=since)
 
-    def restart_container(self):
-        print(f"Restarting container '{container_name}'...")
-        self.manage_container(hostname, username, password, container_name, 'restart')
-        time.sleep(10)  # Wait a bit for the container to be up again
-
-    @staticmethod
-    def connect_to_redis():
+    def connect_to_redis(self):
         try:
-            r = redis.StrictRedis(host=redis_host, port=redis_port, password=redis_password, decode_responses=True)
+            r = redis.StrictRedis(host=self.redis_host, port=self.redis_port, password=self.redis_password, decode_responses=True)
             return r
         except Exception as e:
             print(f"Failed to connect to Redis server: {e}")
             return None
 
 
-    def clear_model_data(self, model_name=None, field_name=None):
+    # Work index: per model and stage (summary / evaluation) the sets
+    # index:<model>:<stage>:{done,pending,failed,truncated} hold event keys, and index:events holds
+    # every event key seen. Result writes update them in the same transaction. A result cut off
+    # by the streaming budget is stored but listed as truncated, so resume generates it again.
+    INDEX_STAGES = {'LLM Summary': 'summary', 'LLM Evaluation': 'evaluation'}
+    INDEX_STATES = ('done', 'pending', 'failed', 'truncated')
+    EVENTS_INDEX = 'index:events'
+    # Seconds a remaining_work snapshot outlives its last use; a killed run's copy then expires
+    TODO_TTL = 3600
+
+    def _index_key(self, model_name, stage, state):
+        return f'index:{model_name}:{stage}:{state}'
+
+
+    def _field_stage(self, field):
+        # Map a result field such as 'mistral:7b-instruct:LLM Summary' to its (model, stage) pair;
+        # split at the last colon because Ollama model names usually carry a ':tag'
+        model_name, _, name = field.rpartition(':')
+        stage = self.INDEX_STAGES.get(name)
+        return (model_name, stage) if stage else None
+
+
+    @staticmethod
+    def _is_truncated(stats):
+        # `stats` is the JSON stored in a '<field> Stats' field, if any
+        return bool(stats) and bool(json.loads(stats).get('truncated'))
+
+
+    def _write_result(self, pipe, key, mapping):
+        """Queue an HSET of result fields on `pipe` together with the matching work index updates."""
+        pipe.hset(key, mapping=mapping)
+        for field in mapping:
+            target = self._field_stage(field)
+            if not target:
+                continue
+            model_name, stage = target
+            truncated = self._is_truncated(mapping.get(f'{field} Stats'))
+            state = 'truncated' if truncated else 'done'
+            for other in self.INDEX_STATES:
+                if other != state:
+                    pipe.srem(self._index_key(model_name, stage, other), key)
+            pipe.sadd(self._index_key(model_name, stage, state), key)
+            if stage == 'summary' and not truncated:
+                # A new summary makes the event due for (re-)evaluation
+                pipe.srem(self._index_key(self.eval_model_name, 'evaluation', 'done'), key)
+                pipe.sadd(self._index_key(self.eval_model_name, 'evaluation', 'pending'), key)
+
+
+    def _mark_failed(self, key, model_name, stage, pipe=None):
+        execute = pipe is None
+        pipe = pipe or self.redis_conn.pipeline(transaction=True)
+        pipe.srem(self._index_key(model_name, stage, 'pending'), key)
+        pipe.srem(self._index_key(model_name, stage, 'truncated'), key)
+        pipe.sadd(self._index_key(model_name, stage, 'failed'), key)
+        if execute:
+            pipe.execute()
+
+
+    def rebuild_work_index(self):
+        """Rebuild the work index of the configured models with one SCAN pass over the events."""
+        summary_field = f'{self.summary_model_name}:LLM Summary'
+        evaluation_field = f'{self.eval_model_name}:LLM Evaluation'
+        stages = [(self.summary_model_name, 'summary'), (self.eval_model_name, 'evaluation')]
+        self.redis_conn.delete(self.EVENTS_INDEX, *[self._index_key(model_name, stage, state) for model_name, stage in stages for state in self.INDEX_STATES])
+
+        fields = ['Narrative', summary_field, f'{summary_field} Stats', evaluation_field, f'{evaluation_field} Stats']
+        for batch in batched(self.iter_event_keys(), self.batch_size):
+            pipe = self.redis_conn.pipeline(transaction=False)
+            for key, (narrative, summary, summary_stats, evaluation, evaluation_stats) in self._fetch_fields(batch, fields).items():
+                pipe.sadd(self.EVENTS_INDEX, key)
+                summary_truncated = self._is_truncated(summary_stats)
+                if summary is not None:
+                    pipe.sadd(self._index_key(self.summary_model_name, 'summary', 'truncated' if summary_truncated else 'done'), key)
+                elif narrative:
+                    pipe.sadd(self._index_key(self.summary_model_name, 'summary', 'pending'), key)
+                if evaluation:
+                    pipe.sadd(self._index_key(self.eval_model_name, 'evaluation', 'truncated' if self._is_truncated(evaluation_stats) else 'done'), key)
+                elif narrative and summary and not summary_truncated:
+                    pipe.sadd(self._index_key(self.eval_model_name, 'evaluation', 'pending'), key)
+            pipe.execute()
+        print(f"Work index rebuilt for {self.redis_conn.scard(self.EVENTS_INDEX)} events.")
+
+
+    def remaining_work(self, model_name, stage):
+        """Iterate over the pending, failed and truncated event keys of one model and stage."""
+        if not self.redis_conn.exists(self.EVENTS_INDEX):
+            self.rebuild_work_index()
+
+        # Snapshot the unfinished sets so they can be updated while we iterate
+        todo = self._index_key(model_name, stage, f'todo:{uuid.uuid4().hex[:8]}')
+        pipe = self.redis_conn.pipeline(transaction=True)
+        pipe.sunionstore(todo, [self._index_key(model_name, stage, state) for state in ('pending', 'failed', 'truncated')])
+        pipe.expire(todo, self.TODO_TTL)
+        pipe.execute()
+        refreshed = time.monotonic()
         try:
-            keys = self.redis_conn.keys('*')  # Retrieve all keys
+            for key in self.redis_conn.sscan_iter(todo, count=self.scan_count):
+                # Keep the snapshot alive while a slow consumer is still working through it
+                if time.monotonic() - refreshed > self.TODO_TTL / 2:
+                    self.redis_conn.expire(todo, self.TODO_TTL)
+                    refreshed = time.monotonic()
+                yield key
+        finally:
+            self.redis_conn.delete(todo)
+
+
+    def iter_event_keys(self, key_type='hash'):
+        """Iterate over all `event:*` keys without blocking Redis."""
+        return scan_keys(self.redis_conn, match='event:*', count=self.scan_count, key_type=key_type)
 
-            for key in keys:
-                # If key does not start with 'event:', skip this iteration
-                if not key.startswith('event:'):
-                    continue
 
+    def clear_model_data(self, model_name=None, field_name=None):
+        try:
+            for key in self.iter_event_keys():
                 # Retrieve all field names for the key
                 fields = self.redis_conn.hkeys(key)
                 for field in fields:
@@ -169,8 +516,15 @@ class RedisManager:
                     if field_name and field_name != field:
                         continue
 
-                    # Delete the field
-                    self.redis_conn.hdel(key, field)
+                    # Delete the field and put the event back on the pending work index
+                    pipe = self.redis_conn.pipeline(transaction=True)
+                    pipe.hdel(key, field)
+                    target = self._field_stage(field)
+                    if target:
+                        pipe.srem(self._index_key(*target, 'done'), key)
+                        pipe.srem(self._index_key(*target, 'truncated'), key)
+                        pipe.sadd(self._index_key(*target, 'pending'), key)
+                    pipe.execute()
                     print(f"Cleared '{field}' from '{key}'.")
 
             print(f"Previous data cleared from Redis.")
@@ -180,89 +534,325 @@ class RedisManager:
 
 
 
-    def generate_summaries(self, resume=True):
+    def _generate(self, key, model_name, prompt, options, timeout=None):
+        """Send a single generate request to the API endpoint and return a GenerationResult."""
+        if self.response_cache:
+            cached = self.response_cache.get(model_name, prompt, options)
+            if cached is not None:
+                return GenerationResult(cached, False, None, None, None)
+
+        # Hold the request while the circuit breaker is open for a container recovery
+        self.recovery.wait_available()
+
         headers = {'Content-Type': 'application/json'}
-        keys = self.redis_conn.keys('*')
+        data = {
+            "key": key,
+            "model": model_name,
+            "prompt": prompt,
+            "raw": True,
+            "stream": self.stream_enabled,
+            "options": options
+        }
 
-        pbar = tqdm(total=len(keys), ncols=150)
+        if self.stream_enabled:
+            result = self._generate_stream(headers, data, timeout or self.request_timeout)
+        else:
+            start = time.monotonic()
+            response = requests.post(self.api_endpoint, headers=headers, data=json.dumps(data), timeout=timeout or self.request_timeout)
+            if response.status_code != 200:
+                raise requests.exceptions.HTTPError(f"status code: {response.status_code}, response: {response.text}", response=response)
+            result = GenerationResult(response.json().get('response', ''), False, None, None, time.monotonic() - start)
+
+        # Truncated output is stored but never cached; the work index lists it as truncated, so
+        # remaining_work hands it to a later run, which then requests it again in full
+        if self.response_cache and result.text and not result.truncated:
+            self.response_cache.set(model_name, prompt, options, result.text)
+        return result
+
+
+    def _generate_stream(self, headers, data, timeout):
+        # Consume Ollama's NDJSON token stream; `timeout` now only bounds the gap between
+        # tokens, and the whole generation is cut off after stream_budget seconds
+        start = time.monotonic()
+        ttft = None
+        tokens = []
+        final = {}
+        truncated = False
+
+        with requests.post(self.api_endpoint, headers=headers, data=json.dumps(data), timeout=timeout, stream=True) as response:
+            if response.status_code != 200:
+                raise requests.exceptions.HTTPError(f"status code: {response.status_code}, response: {response.text}", response=response)
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get('error'):
+                    # Ollama reports a failure mid-stream as an error line before closing cleanly
+                    raise requests.exceptions.RequestException(f"stream error: {chunk['error']}", response=response)
+                if chunk.get('response'):
+                    if ttft is None:
+                        ttft = time.monotonic() - start
+                    tokens.append(chunk['response'])
+                if chunk.get('done'):
+                    final = chunk
+                    break
+                if time.monotonic() - start > self.stream_budget:
+                    truncated = True
+                    break
+            else:
+                # The connection closed without a final chunk, so the text is incomplete; failing
+                # here keeps it out of the cache and off the done index
+                if not final:
+                    raise requests.exceptions.RequestException("stream ended without a final chunk", response=response)
+
+        elapsed = time.monotonic() - start
+        # The final chunk reports eval_count and eval_duration (ns); a cut-off stream has
+        # no final chunk, so fall back to counting the chunks received
+        if final.get('eval_count') and final.get('eval_duration'):
+            tokens_per_sec = final['eval_count'] / (final['eval_duration'] / 1e9)
+        else:
+            generation_time = elapsed - (ttft or 0)
+            tokens_per_sec = len(tokens) / generation_time if generation_time > 0 else None
+        return GenerationResult(''.join(tokens), truncated, ttft, tokens_per_sec, elapsed)
+
+
+    @staticmethod
+    def _stats_mapping(field, result):
+        # Latency metrics are stored next to the result, e.g. 'mistral:LLM Summary Stats'
+        if result.elapsed is None:
+            return {}
+        stats = {
+            "truncated": result.truncated,
+            "ttft": round(result.ttft, 3) if result.ttft is not None else None,
+            "tokens_per_sec": round(result.tokens_per_sec, 2) if result.tokens_per_sec is not None else None,
+            "elapsed": round(result.elapsed, 3)
+        }
+        return {f'{field} Stats': json.dumps(stats)}
+
+
+    @staticmethod
+    def _describe(result):
+        if result.elapsed is None:
+            return "cached response"
+        description = f"{result.elapsed:.1f}s"
+        if result.ttft is not None:
+            description += f", first token after {result.ttft:.2f}s"
+        if result.tokens_per_sec:
+            description += f", {result.tokens_per_sec:.1f} tokens/s"
+        if result.truncated:
+            description += ", TRUNCATED"
+        return description
+
+
+    def _fetch_fields(self, keys, fields):
+        """Fetch the given hash fields for a batch of keys in a single pipelined round trip."""
+        pipe = self.redis_conn.pipeline(transaction=False)
         for key in keys:
-            summary_field = f'{self.summary_model_name}:LLM Summary'
-            
-            if resume and self.redis_conn.hexists(key, summary_field):
-                print(f"Summary for {self.summary_model_name} already exists for key: {key}, skipping...")
-                pbar.update(1)
-                continue
+            pipe.hmget(key, fields)
+        return dict(zip(keys, pipe.execute()))
+
+
+    def _flush_writes(self, writes):
+        """Write buffered (key, mapping) pairs in a single transaction and empty the buffer."""
+        if not writes:
+            return
+        pipe = self.redis_conn.pipeline(transaction=True)
+        for key, mapping in writes:
+            self._write_result(pipe, key, mapping)
+        pipe.execute()
+        writes.clear()
+
+
+    def generate_summaries(self, resume=True, max_in_flight=None, pack_size=None):
+        summary_field = f'{self.summary_model_name}:LLM Summary'
+        max_in_flight = max_in_flight or self.max_in_flight
+        # With packing enabled, narratives of at most pack_max_chars are sent pack_size at a time
+        pack_size = self.pack_size if pack_size is None else pack_size
+        if pack_size > 1 and not self.pack_prompt:
+            print("[Warning] No [Packing] prompt configured, sending one event per request.")
+            pack_size = 0
+        # On resume only the events left pending or failed in the work index are touched
+        keys = self.remaining_work(self.summary_model_name, 'summary') if resume else self.iter_event_keys()
+
+        pbar = tqdm(ncols=150)
+        # Requests are kept in a sliding window of at most max_in_flight futures; the oldest
+        # one is always collected first so summaries are written back in key order
+        in_flight = deque()
+        writes = []
+        pack = []
+        try:
+            with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+                for batch in batched(keys, self.batch_size):
+                    for key, (narrative,) in self._fetch_fields(batch, ['Narrative']).items():
+                        narrative = (narrative or '').strip()
+                        if pack_size > 1 and len(narrative) <= self.pack_max_chars:
+                            pack.append((key, narrative))
+                            if len(pack) < pack_size:
+                                continue
+                            job, pack = pack, []
+                        else:
+                            job = [(key, narrative)]
+                        self._submit_summary(executor, in_flight, job)
+
+                        while len(in_flight) >= max_in_flight:
+                            pbar.update(self._collect_oldest(executor, in_flight, summary_field, writes))
+
+                    if len(writes) >= self.batch_size:
+                        self._flush_writes(writes)
+
+                if pack:
+                    self._submit_summary(executor, in_flight, pack)
+                while in_flight:
+                    pbar.update(self._collect_oldest(executor, in_flight, summary_field, writes))
+        finally:
+            self._flush_writes(writes)
+            pbar.close()
+
+
+    def _request_deadline(self):
+        # A streamed request may legitimately run for the whole budget before it is cut off
+        return self.stream_budget + self.request_timeout if self.stream_enabled else self.request_timeout
+
+
+    @staticmethod
+    def _clean_summary(summary):
+        # Clean up the summary by reducing multiple newlines to single newlines
+        # and removing leading whitespace from each line
+        return '\n'.join(line.lstrip() for line in summary.split('\n'))
+
+
+    # Marker lines separating the summaries of a packed reply, e.g. '### Summary 2'
+    PACKED_SUMMARY_PATTERN = re.compile(r'^\s*#+\s*Summary\s+(\d+)\s*:?\s*$', re.MULTILINE | re.IGNORECASE)
 
-            narrative = self.redis_conn.hget(key, 'Narrative').strip()
+    def _summarize_job(self, job):
+        # A job is a list of (key, narrative) pairs; returns a list of (key, GenerationResult)
+        if len(job) == 1:
+            key, narrative = job[0]
             prompt = self.summary_prompt.format(narrative=narrative)
-            data = {
-                "key": key,
-                "model": self.summary_model_name,
-                "prompt": prompt,
-                "raw": True,
-                "stream": False,
-                "options": self.summary_options
-            }
+            return [(key, self._generate(key, self.summary_model_name, prompt, self.summary_options))]
+
+        results = self._generate_packed(job)
+        if results is None:
+            print(f"[Warning] Could not split the packed reply for {len(job)} events, falling back to single requests...")
+            results = [pair for item in job for pair in self._summarize_job([item])]
+        return results
+
+
+    def _generate_packed(self, job):
+        events = '\n'.join(f'### Event {number}\n{narrative}' for number, (_, narrative) in enumerate(job, 1))
+        prompt = self.pack_prompt.format(count=len(job), events=events)
+        # The reply has to hold one summary per event, so scale the token limit accordingly
+        options = dict(self.summary_options, num_predict=self.summary_options['num_predict'] * len(job))
+        result = self._generate(job[0][0], self.summary_model_name, prompt, options)
+        if result.truncated:
+            return None
 
-            try:
-                response = requests.post(self.api_endpoint, headers=headers, data=json.dumps(data), timeout=45)
-                if response.status_code == 200:
-                    parsed_json = response.json()
-                    summary = parsed_json.get('response', '')
-                    # Clean up the summary by reducing multiple newlines to single newlines
-                    # and removing leading whitespace from each line
-                    summary = '\n'.join(line.lstrip() for line in summary.split('\n'))
-
-                    self.redis_conn.hset(key, summary_field, summary)
-                    print(f"\n[Success] Summary for model '{self.summary_model_name}' successfully generated for key: {key}")
-                    print(f"\n'{self.summary_model_name}' Summary: '{self.summary}.")
-                else:
-                    print(f"\n[Error] Failed to get a successful response for key {key}, status code: {response.status_code}")
-            except requests.exceptions.Timeout:
-                print(f"\n[Timeout] Request timed out for key {key}. Attempting to restart the container...")
-                self.restart_container()
+        # re.split with a capture group yields [preamble, number, text, number, text, ...]
+        parts = self.PACKED_SUMMARY_PATTERN.split(result.text)
+        summaries = {int(number): text.strip() for number, text in zip(parts[1::2], parts[2::2])}
+        if sorted(summaries) != list(range(1, len(job) + 1)) or not all(summaries.values()):
+            return None
+        return [(key, result._replace(text=summaries[number])) for number, (key, _) in enumerate(job, 1)]
 
-            pbar.update(1)
-        pbar.close()
 
+    def _submit_summary(self, executor, in_flight, job, attempt=1):
+        # Do not fill the window while the circuit breaker is open
+        self.recovery.wait_available()
+        future = executor.submit(self._summarize_job, job)
+        in_flight.append((job, attempt, future, time.monotonic()))
 
-    def evaluate_summaries(self, resume=True):
-        headers = {'Content-Type': 'application/json'}
-        evaluations_pending = True
 
-        while evaluations_pending:
-            keys = self.redis_conn.keys('*')
-            # Check for empty evaluations
-            evaluations_pending = False
-            pbar = tqdm(total=len(keys), ncols=150)
+    def _collect_oldest(self, executor, in_flight, summary_field, writes):
+        # Collect the oldest job; a job lost to a container failure is requeued at the end of
+        # the window. Returns the number of events finished (0 while the job is retried).
+        job, attempt, future, started = in_flight.popleft()
+        keys = ', '.join(key for key, _ in job)
+        if self._collect_summary(job, future, started, summary_field, writes) and attempt <= self.max_retries:
+            print(f"Requeueing key {keys} (attempt {attempt + 1}/{self.max_retries + 1})...")
+            self._submit_summary(executor, in_flight, job, attempt + 1)
+            return 0
+        return len(job)
 
-            # First pass: generate evaluations
-            for key in keys:
-                self.perform_evaluation(key, headers, resume=True)
-                pbar.update(1)
-            pbar.close()
 
-            
-            for key in keys:
-                evaluation_field = f'{self.eval_model_name}:LLM Evaluation'
-                evaluation = self.redis_conn.hget(key, evaluation_field)
-                if not evaluation:
-                    evaluations_pending = True
-                    print(f"Evaluation for key {key} is empty, re-performing evaluation...")
-                    self.perform_evaluation(key, headers, resume=False)
+    def _collect_summary(self, job, future, started, summary_field, writes):
+        # Returns True when the job was lost to a timeout or an unreachable container
+        keys = ', '.join(key for key, _ in job)
+        # A packed job may fall back to one request per event
+        deadline = started + self._request_deadline() * (len(job) + 1 if len(job) > 1 else 1)
+        try:
+            results = future.result(timeout=max(0, deadline - time.monotonic()))
+        except (FutureTimeoutError, requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+            print(f"\n[Timeout] Request timed out for key {keys}. Attempting to restart the container...")
+            for key, _ in job:
+                self._mark_failed(key, self.summary_model_name, 'summary')
+            self.restart_container(since=started)
+            return True
+        except requests.exceptions.RequestException as e:
+            print(f"\n[Error] Failed to get a successful response for key {keys}, {e}")
+            for key, _ in job:
+                self._mark_failed(key, self.summary_model_name, 'summary')
+            return False
 
-            if not evaluations_pending:
-                print("All evaluations are complete.")
-                break  # Exit the loop if there are no pending evaluations
+        for key, result in results:
+            summary = self._clean_summary(result.text)
 
-            print("Some evaluations are still pending. Re-scanning the Redis database...")
+            writes.append((key, {summary_field: summary, **self._stats_mapping(summary_field, result)}))
+            print(f"\n[Success] Summary for model '{self.summary_model_name}' successfully generated for key: {key} ({self._describe(result)})")
+            print(f"\n'{self.summary_model_name}' Summary: '{summary}'.")
+        return False
 
 
-    def perform_evaluation(self, key, headers, resume=False):
-        narrative = self.redis_conn.hget(key, 'Narrative')
+    def evaluate_summaries(self, resume=True):
+        headers = {'Content-Type': 'application/json'}
+        fields = ['Narrative', f'{self.summary_model_name}:LLM Summary', f'{self.eval_model_name}:LLM Evaluation']
+
+        # Single pass over the remaining work (or the whole corpus); events whose evaluation
+        # could not be generated are tracked and retried up to max_retries times
+        keys = self.remaining_work(self.eval_model_name, 'evaluation') if resume else self.iter_event_keys()
+        failed = []
+        writes = []
+        pbar = tqdm(ncols=150)
+        for batch in batched(keys, self.batch_size):
+            for key, values in self._fetch_fields(batch, fields).items():
+                narrative, summary, _ = values
+                if not self.perform_evaluation(key, headers, resume=False, fields=values, writes=writes) and narrative and summary:
+                    failed.append(key)
+                pbar.update(1)
+            self._flush_writes(writes)
+        pbar.close()
+
+        for attempt in range(1, self.max_retries + 1):
+            if not failed:
+                break
+            print(f"{len(failed)} evaluations are still pending, retry {attempt}/{self.max_retries}...")
+            retry, failed = failed, []
+            for batch in batched(retry, self.batch_size):
+                for key, values in self._fetch_fields(batch, fields).items():
+                    if not self.perform_evaluation(key, headers, resume=False, fields=values, writes=writes):
+                        failed.append(key)
+                self._flush_writes(writes)
+
+        for key in failed:
+            self._mark_failed(key, self.eval_model_name, 'evaluation')
+        if failed:
+            print(f"[Warning] Evaluation failed for {len(failed)} keys: {', '.join(failed)}")
+        else:
+            print("All evaluations are complete.")
+        return failed
+
+
+    def perform_evaluation(self, key, headers=None, resume=False, fields=None, writes=None):
+        # `fields` holds prefetched (narrative, summary, evaluation) values and `writes` is a
+        # buffer flushed by the caller; without them the event is read and written directly
         summary_field = f'{self.summary_model_name}:LLM Summary'
-        summary = self.redis_conn.hget(key, summary_field)
         evaluation_field = f'{self.eval_model_name}:LLM Evaluation'
+        if fields is None:
+            fields = self.redis_conn.hmget(key, ['Narrative', summary_field, evaluation_field])
+        narrative, summary, existing = fields
+
+        if resume and existing:
+            print(f"Evaluation for {self.eval_model_name} already exists for key: {key}, skipping...")
+            return existing
 
         if not narrative or not summary:
             print(f"[Warning] Missing narrative or summary for key: {key}")
@@ -270,118 +860,260 @@ class RedisManager:
 
         # Use the configured prompt, inserting the narrative and summary
         prompt = self.eval_prompt.format(narrative=narrative, summary=summary)
-        data = {
-            "key": key,
-            "model": self.eval_model_name,
-            "prompt": prompt,
-            "raw": True,
-            "stream": False,
-            "options": self.eval_options
-        }
 
+        started = time.monotonic()
         try:
-            response = requests.post(self.api_endpoint, headers=headers, data=json.dumps(data), timeout=45)
-            if response.status_code == 200:
-                parsed_json = response.json()
-                evaluation = parsed_json.get('response', '')
-                # Strip leading new lines and empty spaces from the evaluation
-                evaluation = evaluation.lstrip()
-                if evaluation:
-                    self.redis_conn.hset(key, evaluation_field, evaluation)
-                    print(f"[Success] Evaluation for model '{self.eval_model_name}' successfully generated for key: {key}\n"
-                            f"\n[Narrative]:\n{self.narrative}\n"
-                            f"\n[Summary]:\n{self.summary}\n"
-                            f"\n[Evaluation]:\n{self.evaluation}\n")
-
+            result = self._generate(key, self.eval_model_name, prompt, self.eval_options)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+            print(f"[Timeout] Request timed out for key {key}. Attempting to restart the container...")
+            self.restart_container(since=started)
+            return
+        except requests.exceptions.HTTPError as e:
+            print(f"[Error] Failed to get a successful response for key {key}, {e}")
+            return
+        except requests.exceptions.RequestException as e:
+            print(f"[RequestException] Request exception for key {key}: {e}")
+            return
 
-                else:
-                    print(f"[Warning] Empty evaluation content for key: {key}")
+        # Strip leading new lines and empty spaces from the evaluation
+        evaluation = result.text.lstrip()
+        if evaluation:
+            mapping = {evaluation_field: evaluation, **self._stats_mapping(evaluation_field, result)}
+            if writes is None:
+                self._flush_writes([(key, mapping)])
             else:
-                print(f"[Error] Failed to get a successful response for key {key}, status code: {response.status_code}, response: {response.text}")
-        except requests.exceptions.Timeout:
-            print(f"[Timeout] Request timed out for key {key}.")
+                writes.append((key, mapping))
+            print(f"[Success] Evaluation for model '{self.eval_model_name}' successfully generated for key: {key} ({self._describe(result)})\n"
+                    f"\n[Narrative]:\n{narrative}\n"
+                    f"\n[Summary]:\n{summary}\n"
+                    f"\n[Evaluation]:\n{evaluation}\n")
+            return evaluation
+        else:
+            print(f"[Warning] Empty evaluation content for key: {key}")
+
+
+    def _ensure_consumer_group(self, stream):
+        try:
+            self.redis_conn.xgroup_create(stream, self.queue_group, id='0', mkstream=True)
+        except redis.exceptions.ResponseError as e:
+            # The group already exists from a previous run
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+
+    def _queued_keys(self, stream):
+        # Event keys still in the stream: waiting, or delivered but not yet acknowledged (in the
+        # PEL). Workers XDEL an entry when they acknowledge it, so nothing else is left behind.
+        queued = set()
+        start = '-'
+        while True:
+            entries = self.redis_conn.xrange(stream, min=start, count=self.scan_count)
+            queued.update(message['key'] for _, message in entries)
+            if len(entries) < self.scan_count:
+                return queued
+            start = '(' + entries[-1][0]
+
+
+    def _requeue_unacknowledged(self, stream):
+        # At startup no worker of an earlier run is alive, so every entry still in the group's PEL
+        # belongs to a killed run. Put those back as new entries rather than waiting for XAUTOCLAIM's
+        # idle timeout, which would outlast workers that exit on an idle stream.
+        requeued = 0
+        cursor = '0-0'
+        while True:
+            cursor, entries, *_ = self.redis_conn.xautoclaim(stream, self.queue_group, f'{stream}:recovery', min_idle_time=0, start_id=cursor, count=self.scan_count)
+            pipe = self.redis_conn.pipeline(transaction=True)
+            for message_id, message in entries:
+                if message:
+                    pipe.xadd(stream, {'key': message['key']})
+                    requeued += 1
+                pipe.xack(stream, self.queue_group, message_id)
+                pipe.xdel(stream, message_id)
+            pipe.execute()
+            if cursor == '0-0':
+                return requeued
+
+
+    def enqueue_pending_work(self):
+        """Queue every event the work index lists as pending or failed and that is not queued already."""
+        queued = skipped = 0
+        for stream, model_name, stage in ((self.summary_stream, self.summary_model_name, 'summary'), (self.eval_stream, self.eval_model_name, 'evaluation')):
+            # Entries left behind by an interrupted run are requeued by run_pipeline, so skip them here
+            in_stream = self._queued_keys(stream)
+            for batch in batched(self.remaining_work(model_name, stage), self.batch_size):
+                pipe = self.redis_conn.pipeline(transaction=False)
+                for key in batch:
+                    if key in in_stream:
+                        skipped += 1
+                        continue
+                    pipe.xadd(stream, {'key': key})
+                    queued += 1
+                pipe.execute()
+        print(f"Queued {queued} events for summarization or evaluation, {skipped} were still queued.")
+        return queued
+
+
+    def _summarize_event(self, key):
+        summary_field = f'{self.summary_model_name}:LLM Summary'
+        narrative = self.redis_conn.hget(key, 'Narrative')
+        if not narrative:
+            print(f"[Warning] Missing narrative for key: {key}")
+            return True
+
+        prompt = self.summary_prompt.format(narrative=narrative.strip())
+        started = time.monotonic()
+        try:
+            result = self._generate(key, self.summary_model_name, prompt, self.summary_options)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+            print(f"\n[Timeout] Request timed out for key {key}. Attempting to restart the container...")
+            self.restart_container(since=started)
+            return False
         except requests.exceptions.RequestException as e:
-            print(f"[RequestException] Request exception for key {key}: {e}")
+            print(f"\n[Error] Failed to get a successful response for key {key}, {e}")
+            return False
+
+        # Store the summary and immediately hand the event over to the evaluation workers
+        pipe = self.redis_conn.pipeline(transaction=True)
+        self._write_result(pipe, key, {summary_field: self._clean_summary(result.text), **self._stats_mapping(summary_field, result)})
+        pipe.xadd(self.eval_stream, {'key': key})
+        pipe.execute()
+        print(f"\n[Success] Summary for model '{self.summary_model_name}' successfully generated for key: {key} ({self._describe(result)})")
+        return True
 
 
+    def _evaluate_event(self, key):
+        return bool(self.perform_evaluation(key, resume=False))
+
+
+    def _queue_worker(self, stream, handler, stop_event, model_name, stage):
+        consumer = f'{stream}:{uuid.uuid4().hex[:8]}'
+        attempts_hash = f'{stream}:attempts'
+
+        while True:
+            # Reclaim jobs left unacknowledged by workers that died, then read new ones
+            _, entries, *_ = self.redis_conn.xautoclaim(stream, self.queue_group, consumer, min_idle_time=self.queue_claim_idle_ms, start_id='0-0', count=1)
+            if not entries:
+                response = self.redis_conn.xreadgroup(self.queue_group, consumer, {stream: '>'}, count=1, block=self.queue_block_ms)
+                entries = response[0][1] if response else []
+
+            if not entries:
+                if stop_event.is_set():
+                    break
+                continue
+
+            for message_id, message in entries:
+                key = message['key']
+                pipe = self.redis_conn.pipeline(transaction=True)
+                if handler(key):
+                    pipe.hdel(attempts_hash, key)
+                elif self.redis_conn.hincrby(attempts_hash, key, 1) < self.max_retries:
+                    pipe.xadd(stream, {'key': key})
+                else:
+                    print(f"[Warning] Giving up on key {key} after {self.max_retries} attempts.")
+                    pipe.hdel(attempts_hash, key)
+                    self._mark_failed(key, model_name, stage, pipe)
+                pipe.xack(stream, self.queue_group, message_id)
+                pipe.xdel(stream, message_id)
+                pipe.execute()
+
+
+    def run_pipeline(self, summary_workers=None, eval_workers=None, enqueue=True):
+        """Run summary and evaluation workers concurrently over the Redis work queues.
+
+        Each finished summary is pushed straight onto the evaluation stream, so evaluation
+        overlaps generation instead of waiting for the whole corpus to be summarized.
+        """
+        summary_workers = summary_workers or self.max_in_flight
+        eval_workers = eval_workers or self.max_in_flight
+
+        requeued = 0
+        for stream in (self.summary_stream, self.eval_stream):
+            self._ensure_consumer_group(stream)
+            requeued += self._requeue_unacknowledged(stream)
+        if requeued:
+            print(f"Requeued {requeued} events left unacknowledged by an interrupted run.")
+        if enqueue:
+            self.enqueue_pending_work()
+
+        # Summary workers exit as soon as their stream is idle; evaluation workers keep
+        # waiting until the summary workers are done and their own stream is idle
+        summaries_done = threading.Event()
+        summaries_done.set()
+        evaluations_done = threading.Event()
+        summary_threads = [threading.Thread(target=self._queue_worker, args=(self.summary_stream, self._summarize_event, summaries_done, self.summary_model_name, 'summary')) for _ in range(summary_workers)]
+        eval_threads = [threading.Thread(target=self._queue_worker, args=(self.eval_stream, self._evaluate_event, evaluations_done, self.eval_model_name, 'evaluation')) for _ in range(eval_workers)]
+
+        for thread in summary_threads + eval_threads:
+            thread.start()
+        for thread in summary_threads:
+            thread.join()
+        evaluations_done.set()
+        for thread in eval_threads:
+            thread.join()
+
+        failed_summaries = self.redis_conn.scard(self._index_key(self.summary_model_name, 'summary', 'failed'))
+        failed_evaluations = self.redis_conn.scard(self._index_key(self.eval_model_name, 'evaluation', 'failed'))
+        print(f"Pipeline finished: {failed_summaries} failed summaries, {failed_evaluations} failed evaluations.")
+
+
+
+    MULTIPLE_NEWLINES = re.compile(r'\n+')
 
     def clean_text(self, text):
         """Remove extra newlines, leading/trailing whitespace, and ensure text starts with the first word."""
-        # Remove leading and trailing whitespace
+        # Remove leading and trailing whitespace, which also drops any leading newlines
         text = text.strip()
         # Replace multiple newlines with a single newline
-        text = re.sub(r'\n+', '\n', text)
-        # Ensure text starts with the first word (remove leading newlines)
-        text = re.sub(r'^\n+', '', text)
-        return text
+        return self.MULTIPLE_NEWLINES.sub('\n', text)
 
 
     def generate_summaries_for_event(self, event_id, summary_model_name):
-        headers = {'Content-Type': 'application/json'}
         key = f'event:{event_id}'
 
         narrative = self.redis_conn.hget(key, 'Narrative').strip()
         prompt = self.summary_prompt.format(narrative=narrative)
-        data = {
-            "key": key,
-            "model": summary_model_name,
-            "prompt": prompt,
-            "raw": True,
-            "stream": False,
-            "options": self.summary_options
-        }
 
-        response = requests.post(self.api_endpoint, headers=headers, data=json.dumps(data), timeout=45)
-        if response.status_code == 200:
-            parsed_json = response.json()
-            summary = parsed_json.get('response', '')
-            # Clean up the summary by reducing multiple newlines to single newlines
-            # and removing leading whitespace from each line
-            summary = '\n'.join(line.lstrip() for line in summary.split('\n'))
+        try:
+            result = self._generate(key, summary_model_name, prompt, self.summary_options)
+        except requests.exceptions.RequestException as e:
+            print(f"Failed to generate summary for key: {key}, {e}")
+            return None
 
-            self.redis_conn.hset(key, f'{summary_model_name}:LLM Summary', summary)
-            print(f"Summary for model '{summary_model_name}' successfully generated for key: {key}")
-        else:
-            print(f"Failed to generate summary for key: {key}, status code: {response.status_code}")
+        summary_field = f'{summary_model_name}:LLM Summary'
+        summary = self._clean_summary(result.text)
+        self._flush_writes([(key, {summary_field: summary, **self._stats_mapping(summary_field, result)})])
+        print(f"Summary for model '{summary_model_name}' successfully generated for key: {key} ({self._describe(result)})")
         return summary
 
 
     def evaluate_summaries_for_event(self, event_id, eval_model_name):
-        headers = {'Content-Type': 'application/json'}
         key = f'event:{event_id}'
 
         narrative = self.redis_conn.hget(key, 'Narrative')
         summary = self.redis_conn.hget(key, f'{self.summary_model_name}:LLM Summary')
         prompt = self.eval_prompt.format(narrative=narrative, summary=summary)
-        data = {
-            "key": key,
-            "model": eval_model_name,
-            "prompt": prompt,
-            "raw": True,
-            "stream": False,
-            "options": self.eval_options
-        }
 
-        response = requests.post(self.api_endpoint, headers=headers, data=json.dumps(data), timeout=45)
-        if response.status_code == 200:
-            parsed_json = response.json()
-            evaluation = parsed_json.get('response', '')
-            # Strip leading new lines and empty spaces from the evaluation
-            evaluation = evaluation.lstrip()
+        try:
+            result = self._generate(key, eval_model_name, prompt, self.eval_options)
+        except requests.exceptions.RequestException as e:
+            print(f"Failed to generate evaluation for key: {key}, {e}")
+            return None
+
+        # Strip leading new lines and empty spaces from the evaluation
+        evaluation_field = f'{eval_model_name}:LLM Evaluation'
+        evaluation = result.text.lstrip()
 
-            self.redis_conn.hset(key, f'{eval_model_name}:LLM Evaluation', evaluation)
-            print(f"Evaluation for model '{eval_model_name}' successfully generated for key: {key}")
+        self._flush_writes([(key, {evaluation_field: evaluation, **self._stats_mapping(evaluation_field, result)})])
+        print(f"Evaluation for model '{eval_model_name}' successfully generated for key: {key} ({self._describe(result)})")
 
-            # Check if the Redis cache has been updated correctly
-            redis_evaluation = self.redis_conn.hget(key, f'{eval_model_name}:LLM Evaluation').strip()
-            if redis_evaluation == evaluation:
-                print(f"Redis cache updated correctly for key: {key}")
-            else:
-                print(f"Error: Redis cache not updated correctly for key: {key}")
-                print(f"Redis evaluation: {redis_evaluation}")
-                print(f"Original evaluation: {evaluation}")
+        # Check if the Redis cache has been updated correctly
+        redis_evaluation = self.redis_conn.hget(key, f'{eval_model_name}:LLM Evaluation').strip()
+        if redis_evaluation == evaluation:
+            print(f"Redis cache updated correctly for key: {key}")
         else:
-            print(f"Failed to generate evaluation for key: {key}, status code: {response.status_code}")
+            print(f"Error: Redis cache not updated correctly for key: {key}")
+            print(f"Redis evaluation: {redis_evaluation}")
+            print(f"Original evaluation: {evaluation}")
         return evaluation
 
 
@@ -402,29 +1134,137 @@ class RedisManager:
 
 
 
-    def create_excel_from_redis(self):
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Extract Summary"
-        headers = [
-            'Key',
-            'Narrative',
-            f'{self.summary_model_name} Summary',
-            f'{self.eval_model_name} Evaluation'
-        ]
-        ws.append(headers)
-        keys = self.redis_conn.keys('*')
-
-        for key in keys:
-            narrative = self.redis_conn.hget(key, 'Narrative')
-            summary = self.redis_conn.hget(key, f'{self.summary_model_name}:LLM Summary')
-            evaluation = self.redis_conn.hget(key, f'{self.eval_model_name}:LLM Evaluation')
-
-            # Clean up the text for narrative, summary, and evaluation
-            narrative = self.clean_text(narrative) if narrative else narrative
-            summary = self.clean_text(summary) if summary else summary
-            evaluation = self.clean_text(evaluation) if evaluation else evaluation
+    @staticmethod
+    def _cell_to_string(value):
+        # Compact string form of a spreadsheet cell: empty for blanks/NaN, no trailing '.0' on
+        # whole numbers, and dates without a midnight time component
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            return ''
+        if isinstance(value, float) and value.is_integer():
+            return str(int(value))
+        if isinstance(value, datetime.datetime):
+            return value.date().isoformat() if value.time() == datetime.time() else value.isoformat(sep=' ')
+        if isinstance(value, (datetime.date, datetime.time)):
+            return value.isoformat()
+        return str(value).strip()
+
+
+    def upsert_events(self, events):
+        """Write a batch of {key: mapping} events, skipping those whose content hash is unchanged.
+
+        Written events join index:events, and any with a narrative but no current summary (new,
+        edited, or stored earlier without one) are put on the summary work index. Returns the
+        number of events written and the number left unchanged.
+        """
+        summary_field = f'{self.summary_model_name}:LLM Summary'
+        # Index events stored before the work index existed, or resume would never see them
+        if not self.redis_conn.exists(self.EVENTS_INDEX):
+            self.rebuild_work_index()
+        # One round trip for the stored content hashes, one for all changed events
+        stored = self._fetch_fields(list(events), ['Content Hash', 'Narrative', summary_field])
+        pipe = self.redis_conn.pipeline(transaction=False)
+        written = unchanged = 0
+        for key, mapping in events.items():
+            content_hash = hashlib.sha1(json.dumps(mapping, sort_keys=True).encode()).hexdigest()
+            stored_hash, stored_narrative, stored_summary = stored[key]
+            if stored_hash == content_hash:
+                unchanged += 1
+                continue
 
-            ws.append([key, narrative, summary, evaluation])
+            pipe.hset(key, mapping={**mapping, 'Content Hash': content_hash})
+            pipe.sadd(self.EVENTS_INDEX, key)
+            narrative = mapping.get('Narrative')
+            if narrative and narrative != stored_narrative:
+                # New or edited narratives need a (new) summary
+                pipe.srem(self._index_key(self.summary_model_name, 'summary', 'done'), key)
+                pipe.srem(self._index_key(self.summary_model_name, 'summary', 'truncated'), key)
+                pipe.sadd(self._index_key(self.summary_model_name, 'summary', 'pending'), key)
+            elif narrative and stored_summary is None:
+                pipe.sadd(self._index_key(self.summary_model_name, 'summary', 'pending'), key)
+            written += 1
+        pipe.execute()
+        return written, unchanged
+
+
+    def ingest_events(self, file_path=None):
+        """Load spreadsheet rows into `event:<KEY_COLUMN>` hashes, rewriting only rows whose content changed."""
+        file_path = file_path or self.extracted_file_path
+        wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        rows = wb.active.iter_rows(values_only=True)
+        headers = [self._cell_to_string(header) for header in next(rows)]
+        key_index = headers.index(self.key_column)
+
+        written = unchanged = 0
+        try:
+            for chunk in batched(rows, self.batch_size):
+                events = {}
+                for row in chunk:
+                    event_number = self._cell_to_string(row[key_index])
+                    if event_number:
+                        events[f'event:{event_number}'] = {header: self._cell_to_string(value) for header, value in zip(headers, row) if header}
+                chunk_written, chunk_unchanged = self.upsert_events(events)
+                written += chunk_written
+                unchanged += chunk_unchanged
+        finally:
+            wb.close()
+
+        print(f"Ingested '{file_path}': {written} events written, {unchanged} unchanged.")
+        return written
+
+
+    def create_excel_from_redis(self, file_path='extract_summary.xlsx', fields=None):
+        self.export_events(file_path, fields)
+
+
+    def _iter_export_rows(self, fields):
+        # Yield one list of cleaned rows per pipelined batch of events
+        for batch in batched(self.iter_event_keys(), self.batch_size):
+            yield [[key] + [self.clean_text(value) if value else value for value in values] for key, values in self._fetch_fields(batch, fields).items()]
+
+
+    def export_events(self, file_path, fields=None):
+        """Export event fields to .xlsx, .csv or .parquet in bounded memory.
+
+        `fields` lists the hash fields to export after the key, e.g. ['Narrative', 'mistral:LLM Summary'];
+        by default the narrative, the configured summary and the configured evaluation are exported.
+        """
+        fields = fields or ['Narrative', f'{self.summary_model_name}:LLM Summary', f'{self.eval_model_name}:LLM Evaluation']
+        # Column headers follow the original export, e.g. 'mistral:LLM Summary' -> 'mistral Summary'
+        headers = ['Key'] + [field.replace(':LLM ', ' ') for field in fields]
+        extension = os.path.splitext(file_path)[1].lower()
+
+        exported = 0
+        if extension == '.xlsx':
+            # A write-only workbook streams rows to disk instead of keeping every cell in memory
+            wb = openpyxl.Workbook(write_only=True)
+            ws = wb.create_sheet("Extract Summary")
+            ws.append(headers)
+            for rows in self._iter_export_rows(fields):
+                for row in rows:
+                    ws.append(row)
+                exported += len(rows)
+            wb.save(file_path)
+        elif extension == '.csv':
+            with open(file_path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(headers)
+                for rows in self._iter_export_rows(fields):
+                    writer.writerows(rows)
+                    exported += len(rows)
+        elif extension == '.parquet':
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ImportError("Parquet export requires the pyarrow package (pip install pyarrow).")
+            schema = pa.schema([(header, pa.string()) for header in headers])
+            # Each pipelined batch becomes one row group
+            with pq.ParquetWriter(file_path, schema) as writer:
+                for rows in self._iter_export_rows(fields):
+                    writer.write_table(pa.Table.from_arrays([pa.array(column, pa.string()) for column in zip(*rows)], schema=schema))
+                    exported += len(rows)
+        else:
+            raise ValueError(f"Unsupported export format '{extension}', use .xlsx, .csv or .parquet")
 
-        wb.save('extract_summary.xlsx')
+        print(f"Exported {exported} events to '{file_path}'.")
+        return exported
@@ -0,0 +1,20 @@
+'''
+Small NumPy helpers for scipy.sparse matrices, shared by the tagging code in iRoils.py and the
+archived tagging scripts.
+'''
+
+import numpy as np
+
+
+def top_k_per_row(matrix, k):
+    """Return the column ids of the k largest entries in each row of a sparse matrix, best first."""
+    matrix = matrix.tocsr()
+    lengths = np.diff(matrix.indptr)
+    if matrix.shape[0] == 0:
+        return []
+    row_ids = np.repeat(np.arange(matrix.shape[0]), lengths)
+    # Sort by row, then by descending score, and keep the first k entries of every row
+    order = np.lexsort((-matrix.data, row_ids))
+    rank = np.arange(len(order)) - matrix.indptr[row_ids[order]]
+    columns = matrix.indices[order[rank < k]]
+    return np.split(columns, np.cumsum(np.minimum(lengths, k))[:-1])
@@ -1,4 +1,5 @@
 from pyTQA import tqa
+from tqa import MetadataCache
 import sys
 import json
 import requests
@@ -55,20 +56,24 @@ def upload_ils_incident(site, reporter="", description="", occurred_date_time=-1
     return response
 
 
+# Name-to-id lookups and ILS catalogs, cached in tqa_metadata.json between runs
+metadata = MetadataCache()
+
+
 def get_machine_id(machine_name):
-    idx = tqa.get_machine_id_from_str(machine_name)
+    idx = metadata.machine_id(machine_name)
     print("Machine Name: {} ".format(machine_name) + " (ID: {})".format(str(idx)))
     return idx
 
 
 def get_schedule_id(schedule_name, machine_idx):
-    idx = tqa.get_schedule_id_from_string(schedule_name, machine_idx)
+    idx = metadata.schedule_id(schedule_name, machine_idx)
     print("Schedule Name: {}".format(schedule_name) + " (ID: {})".format(str(idx)))
     return idx
 
 
 def get_variable_id(var_name, schedule_id):
-    idx = tqa.get_variable_id_from_string(var_name, schedule_id)
+    idx = metadata.variable_id(var_name, schedule_id)
     print("Variable Name: {}".format(var_name) + " (ID: {})".format(str(idx)))
     return idx
 
@@ -79,14 +84,17 @@ if __name__ == '__main__':
     if not connection_success:
         sys.exit(3)
 
-    # categories = tqa.get_request('/ils-categories')
+    # metadata.prefetch()  # load the ILS catalogs once; later lookups are served from the cache file
+    # categories = metadata.catalog('/ils-categories')
     # print(categories)
 
-    # hazards = tqa.get_request('/ils-hazards')
+    # hazards = metadata.catalog('/ils-hazards')
     # print(hazards)
 
-    # custom_fields = tqa.get_request('/ils-custom-fields')
-    # print(json.dumps(custom_fields["json"], indent=4, sort_keys=True))
+    # custom_fields = metadata.catalog('/ils-custom-fields')
+    # print(json.dumps(custom_fields, indent=4, sort_keys=True))
+
+    # metadata.invalidate('catalog:')  # force the catalogs to be fetched again
 
     #dumps all the incidents
     ils_incidents = tqa.get_request('/ils')
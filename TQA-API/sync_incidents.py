@@ -0,0 +1,35 @@
+'''
+Pulls ILS incidents from TQA into Redis.
+
+Pages through /ils and writes each incident to an `event:<id>` hash with pipelined writes. Only incidents modified
+since the stored high-water mark are requested, so repeated runs fetch just what changed since the last sync.
+
+Usage:
+    python sync_incidents.py [--site SITE] [--since TIMESTAMP] [--full]
+'''
+
+import os
+import sys
+import argparse
+import tqa
+
+# The event store and its work index are managed by LLM-inferencing/redis_class.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'LLM-inferencing'))
+from redis_class import RedisManager
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Sync ILS incidents from TQA into Redis.')
+    arg_parser.add_argument('--site', help='only sync incidents of this site')
+    arg_parser.add_argument('--since', help='ignore the stored high-water mark and sync incidents modified after this time')
+    arg_parser.add_argument('--full', action='store_true', help='ignore the high-water mark and sync every incident')
+    args = arg_parser.parse_args()
+
+    if not tqa.connect_to_tqa():
+        sys.exit(3)
+    manager = RedisManager()
+    try:
+        manager.redis_conn.ping()
+    except Exception as e:
+        print(f"Failed to connect to Redis server: {e}")
+        sys.exit(1)
+    tqa.sync_incidents(manager, site=args.site, since=args.since, full=args.full)
@@ -7,9 +7,14 @@ This script demonstrates how to connect to TQA (Threat and Vulnerability Assessm
 The script includes the following functions:
 
 connect_to_tqa: Connects to TQA using the configuration values from the config.ini file.
+TokenManager: Refreshes the access token in the background before it expires and re-authenticates once on a 401.
 read_spreadsheet: Reads data from a spreadsheet using pandas.
 upload_ils_incident: Uploads an ILS (Incident Logging System) incident to TQA using the TQA API.
 process_entries: Processes entries from a spreadsheet and uploads incidents to TQA.
+prepare_payloads: Converts a whole sheet into ready-to-send ILS payloads, parsing the date column once.
+bulk_upload: Uploads a whole sheet concurrently over a pooled session, with rate limiting, retries and a checkpoint file.
+MetadataCache: Caches TQA catalogs and machine/schedule/variable ids in memory and in a local file, with TTLs.
+sync_incidents: Pages through /ils and writes new or modified incidents into the `event:*` hashes in Redis.
 To use this script, you need to have the pyTQA, pandas, requests, datetime, configparser, and dateutil modules installed. You also need to provide the necessary configuration values in the config.ini file.
 
 The script demonstrates an example usage where it connects to TQA, reads data from a spreadsheet, and uploads incidents to TQA based on the data in the spreadsheet. You can choose to process the entire sheet or a specific range of rows by uncommenting the appropriate line in the __main__ block.
@@ -19,36 +24,274 @@ Please make sure to replace the placeholder values in the config.ini file with y
 
 import pandas as pd
 from pyTQA import tqa
+import os
 import sys
 import json
+import time
 import requests
 import datetime
+import threading
 import configparser  # Import the configparser module
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from dateutil import parser
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Read the config.ini file
 config = configparser.ConfigParser()
 config.read('config.ini')
 
+# Access token lifetime; the token is refreshed REFRESH_MARGIN seconds before it runs out
+token_ttl = config.getint('TQA', 'TOKEN_TTL', fallback=3600)
+token_refresh_margin = config.getint('TQA', 'REFRESH_MARGIN', fallback=300)
+
+# Connect and read timeouts (seconds) for every request sent through TokenManager, so a stalled connection fails
+request_timeout = (config.getfloat('TQA', 'CONNECT_TIMEOUT', fallback=10), config.getfloat('TQA', 'READ_TIMEOUT', fallback=60))
+
+# Bulk upload settings
+upload_workers = config.getint('Upload', 'max_workers', fallback=8)
+upload_rate = config.getfloat('Upload', 'rate_per_second', fallback=5)
+upload_retries = config.getint('Upload', 'max_retries', fallback=5)
+upload_backoff = config.getfloat('Upload', 'backoff_factor', fallback=0.5)
+upload_checkpoint = config.get('Upload', 'checkpoint', fallback='upload_checkpoint.txt')
+
+# Incident sync settings; parameter and field names follow the TQA /ils API and can be changed in [Sync]
+sync_page_size = config.getint('Sync', 'page_size', fallback=100)
+sync_page_param = config.get('Sync', 'page_param', fallback='page')
+sync_page_size_param = config.get('Sync', 'page_size_param', fallback='pageSize')
+sync_max_pages = config.getint('Sync', 'max_pages', fallback=10000)
+sync_modified_param = config.get('Sync', 'modified_since_param', fallback='modifiedSince')
+sync_items_key = config.get('Sync', 'items_key', fallback='')
+sync_id_field = config.get('Sync', 'id_field', fallback='id')
+sync_narrative_field = config.get('Sync', 'narrative_field', fallback='description')
+sync_modified_field = config.get('Sync', 'modified_field', fallback='modified')
+sync_high_water_key = config.get('Sync', 'high_water_key', fallback='tqa:sync:high_water')
+
+# Metadata cache settings
+metadata_cache_path = config.get('Metadata', 'cache_path', fallback='tqa_metadata.json')
+metadata_ttl = config.getint('Metadata', 'ttl', fallback=86400)
+metadata_catalogs = [path.strip() for path in config.get('Metadata', 'catalogs', fallback='/ils-categories, /ils-hazards, /ils-custom-fields').split(',')]
+
+class TokenManager:
+    """Keeps the pyTQA access token valid for long uploads and syncs.
+
+    A daemon thread refreshes the token `margin` seconds before its expected expiry, and request() re-authenticates
+    and retries once if TQA answers 401 anyway. Concurrent 401s for the same token trigger a single refresh.
+    """
+
+    def __init__(self, ttl=token_ttl, margin=token_refresh_margin):
+        self.ttl = ttl
+        self.margin = min(margin, ttl // 2)
+        self.expires_at = 0
+        # Reentrant, so reauthenticate can check the token and refresh it in one critical section
+        self.lock = threading.RLock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def refresh(self):
+        with self.lock:
+            tqa.set_tqa_token()
+            if not tqa.access_token:
+                return False
+            self.expires_at = time.monotonic() + self.ttl
+            return True
+
+    def reauthenticate(self, rejected_token):
+        # Only the first thread to see a 401 for this token refreshes it; the others wait on the lock
+        # and then reuse the new one
+        with self.lock:
+            if tqa.access_token != rejected_token:
+                return True
+            print("[Warning] TQA rejected the access token, re-authenticating.")
+            return self.refresh()
+
+    def headers(self):
+        if time.monotonic() >= self.expires_at:
+            with self.lock:
+                # Checked again under the lock so threads arriving together refresh only once
+                if time.monotonic() >= self.expires_at:
+                    self.refresh()
+        return tqa.get_standard_headers()
+
+    def request(self, method, url, session=None, **kwargs):
+        """Send a request with the current token, retrying once after re-authentication if it gets a 401."""
+        sender = session or requests
+        kwargs.setdefault('timeout', request_timeout)
+        token = tqa.access_token
+        response = sender.request(method, url, headers=self.headers(), **kwargs)
+        if response.status_code == 401 and self.reauthenticate(token):
+            response = sender.request(method, url, headers=self.headers(), **kwargs)
+        return response
+
+    def _run(self):
+        while not self.stop_event.wait(max(self.expires_at - self.margin - time.monotonic(), 0)):
+            try:
+                refreshed = self.refresh()
+            except Exception as e:
+                print(f"[Error] TQA token refresh raised {e!r}")
+                refreshed = False
+            if not refreshed:
+                print("[Warning] TQA token refresh failed, retrying in 30 seconds.")
+                self.stop_event.wait(30)
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, name='tqa-token-refresh', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+tokens = TokenManager()
+
 def connect_to_tqa():
     # Use the configuration values
     tqa.client_id = config['TQA']['CLIENT_ID']
     tqa.client_key = config['TQA']['CLIENT_KEY']
     tqa.base_url = config['TQA']['BASE_URL']  # Assuming you need base_url for API calls
-    tqa.set_tqa_token()
 
-    if len(tqa.access_token) == 0:
+    if not tokens.refresh():
         print("TQA Connection failed")
         return False
     else:
+        # Keep the token fresh for the rest of the run
+        tokens.start()
         print("TQA Connection Established: Access Token {}".format(tqa.access_token))
         return True
 
+class MetadataCache:
+    """TQA metadata lookups served from memory, persisted to a JSON file and refreshed once older than `ttl` seconds.
+
+    Catalogs such as /ils-categories are fetched whole and indexed by name, so resolving a name is a dict hit.
+    Machine, schedule and variable ids are remembered per name after their first remote lookup.
+    """
+
+    def __init__(self, path=metadata_cache_path, ttl=metadata_ttl):
+        self.path = path
+        self.ttl = ttl
+        self.entries = {}
+        self.indexes = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def _save(self):
+        if self.path:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+
+    def _cached(self, name, loader):
+        entry = self.entries.get(name)
+        if entry is None or time.time() - entry['fetched'] > self.ttl:
+            entry = {'fetched': time.time(), 'value': loader()}
+            self.entries[name] = entry
+            self.indexes.pop(name, None)
+            self._save()
+        return entry['value']
+
+    def catalog(self, path):
+        return self._cached(f'catalog:{path}', lambda: tqa.get_request(path)['json'])
+
+    def catalog_index(self, path, key='name', value='id'):
+        # name -> id dict for a catalog, rebuilt only when the catalog itself is refreshed
+        items = self.catalog(path)
+        name = f'catalog:{path}'
+        if name not in self.indexes:
+            self.indexes[name] = {item[key]: item[value] for item in items if isinstance(item, dict) and key in item}
+        return self.indexes[name]
+
+    def lookup(self, path, name):
+        return self.catalog_index(path).get(name)
+
+    def prefetch(self, paths=None):
+        """Load whole catalogs up front so upload loops never wait on a metadata request."""
+        for path in paths or metadata_catalogs:
+            self.catalog_index(path)
+
+    def machine_id(self, machine_name):
+        return self._cached(f'machine:{machine_name}', lambda: tqa.get_machine_id_from_str(machine_name))
+
+    def schedule_id(self, schedule_name, machine_id):
+        return self._cached(f'schedule:{machine_id}:{schedule_name}', lambda: tqa.get_schedule_id_from_string(schedule_name, machine_id))
+
+    def variable_id(self, var_name, schedule_id):
+        return self._cached(f'variable:{schedule_id}:{var_name}', lambda: tqa.get_variable_id_from_string(var_name, schedule_id))
+
+    def invalidate(self, prefix=''):
+        """Drop every entry whose name starts with `prefix` (e.g. 'catalog:/ils-hazards' or 'machine:'); all by default."""
+        self.entries = {name: entry for name, entry in self.entries.items() if not name.startswith(prefix)}
+        self.indexes = {}
+        self._save()
+
 def read_spreadsheet(file_path):
     data = pd.read_excel(file_path)
     return data
 
-def upload_ils_incident(site, reporter="", description="", occurred_date_time=-1, date_format=-1, gold_star=-1, custom_field=None):
+class UploadRetry(Retry):
+    """Retry policy that never repeats a POST the server may already have acted on.
+
+    POST is left out of `allowed_methods`, so read errors on it are not retried; connect errors still are, because
+    the request never reached the server. Of the retryable statuses only 429 and 503 are retried for POST, as both
+    mean the incident was not created. Any other failure is left to the checkpoint on the next run.
+    """
+
+    POST_STATUS_FORCELIST = frozenset([429, 503])
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method and method.upper() == 'POST':
+            return bool(self.total) and status_code in self.POST_STATUS_FORCELIST
+        return super().is_retry(method, status_code, has_retry_after)
+
+def create_session(pool_size=upload_workers, retries=upload_retries, backoff_factor=upload_backoff):
+    """Session with a keep-alive connection pool that retries 429 and 5xx replies with exponential backoff (see UploadRetry for POST)."""
+    retry = UploadRetry(total=retries, backoff_factor=backoff_factor, status_forcelist=[429, 500, 502, 503, 504],
+                        respect_retry_after_header=True, raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+class RateLimiter:
+    """Spaces calls evenly so that no more than `rate` start per second across all threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+class UploadCheckpoint:
+    """Append-only file of row ids that were uploaded successfully."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.done = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                self.done = {line.strip() for line in f if line.strip()}
+
+    def __contains__(self, row_id):
+        return str(row_id) in self.done
+
+    def add(self, row_id):
+        with self.lock:
+            with open(self.path, 'a') as f:
+                f.write(f"{row_id}\n")
+            self.done.add(str(row_id))
+
+def upload_ils_incident(site, reporter="", description="", occurred_date_time=-1, date_format=-1, gold_star=-1, custom_field=None, session=None):
     if custom_field is None:
         custom_field = {}
 
@@ -70,32 +313,193 @@ def upload_ils_incident(site, reporter="", description="", occurred_date_time=-1
     if custom_field:
         ils_upload_data["customFields"] = custom_field
 
-    json_ils_data = json.dumps(ils_upload_data)
-    std_headers = tqa.get_standard_headers()
+    return post_ils_payload(json.dumps(ils_upload_data), session)
+
+def post_ils_payload(json_ils_data, session=None):
     url_process = ''.join([tqa.base_url, '/ils'])
-    response = requests.post(url_process, headers=std_headers, data=json_ils_data)
+    response = tokens.request('POST', url_process, session=session, data=json_ils_data)
     return response
 
+def parse_occurred_column(data):
+    """Parse the occurred_date_time column in one vectorized pass per date format; blank cells become NaT."""
+    values = data['occurred_date_time']
+    formats = data['date_format'] if 'date_format' in data.columns else pd.Series(None, index=data.index, dtype=object)
+    occurred = pd.Series(pd.NaT, index=data.index, dtype='datetime64[ns]')
+    for date_format, group in values.groupby(formats.fillna(''), sort=False):
+        if date_format:
+            # read_excel already returns date cells as datetimes; only the text cells need the format
+            is_datetime = group.map(lambda value: isinstance(value, datetime.date))
+            occurred[group.index[is_datetime]] = pd.to_datetime(group[is_datetime])
+            text = group[~is_datetime]
+            occurred[text.index] = pd.to_datetime(text.astype(str), format=date_format, errors='coerce')
+        else:
+            # No format given, so every cell is parsed on its own like dateutil would
+            occurred[group.index] = pd.to_datetime(group, format='mixed', errors='coerce')
+    return occurred
+
+def prepare_payloads(data):
+    """Yield (row index, JSON payload) for every row of the sheet, ready for post_ils_payload.
+
+    Optional columns are resolved once for the whole sheet and dates are parsed column-wise. Rows whose date cannot
+    be parsed are reported and skipped; rows without a date get the current time, as upload_ils_incident does.
+    """
+    now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M')
+    if 'occurred_date_time' in data.columns:
+        occurred = parse_occurred_column(data)
+        unparsed = occurred.isna() & data['occurred_date_time'].notna()
+        occurred = occurred.dt.strftime('%Y-%m-%d %H:%M').where(occurred.notna(), now)
+    else:
+        unparsed = pd.Series(False, index=data.index)
+        occurred = pd.Series(now, index=data.index)
+
+    sites = data['site'].astype(str)
+    reporters = data['reporter'].fillna('')
+    descriptions = data['description'].fillna('')
+    none = pd.Series(None, index=data.index, dtype=object)
+    # Blank cells become None, not NaN, so they are left out of the payload
+    gold_stars = data['gold_star'].astype(object).where(data['gold_star'].notna(), None) if 'gold_star' in data.columns else none
+    custom_fields = data['custom_field'].astype(object).where(data['custom_field'].notna(), None) if 'custom_field' in data.columns else none
+
+    for index, site, reporter, description, incident_dt, bad_date, gold_star, custom_field in zip(
+            data.index, sites, reporters, descriptions, occurred, unparsed, gold_stars, custom_fields):
+        if bad_date:
+            print(f"[Warning] Skipping row {index}: unparseable occurred_date_time {data.at[index, 'occurred_date_time']!r}")
+            continue
+        ils_upload_data = {"site": site, "description": description, "reporterName": reporter, "occurred": incident_dt}
+        if pd.notna(gold_star):
+            ils_upload_data["goldStar"] = str(gold_star)
+        if pd.notna(custom_field) and custom_field != '':
+            ils_upload_data["customFields"] = custom_field
+        yield index, json.dumps(ils_upload_data)
+
+def select_rows(data, start_row=None, end_row=None):
+    if start_row is None and end_row is None:
+        return data
+    return data.loc[start_row:end_row-1 if end_row is not None else None]
+
 def process_entries(file_path, start_row=None, end_row=None):
     data = read_spreadsheet(file_path)
+    entries_to_process = select_rows(data, start_row, end_row)
     
-    if start_row is None and end_row is None:
-        entries_to_process = data
-    else:
-        entries_to_process = data.loc[start_row:end_row-1 if end_row is not None else None]
-    
-    for index, row in entries_to_process.iterrows():
-        site = row['site']
-        reporter = row['reporter']
-        description = row['description']
-        occurred_date_time = row['occurred_date_time'] if 'occurred_date_time' in row else -1
-        date_format = row['date_format'] if 'date_format' in row else -1
-        gold_star = row['gold_star'] if 'gold_star' in row else -1
-        custom_field = row['custom_field'] if 'custom_field' in row else None
-        
-        response = upload_ils_incident(site, reporter, description, occurred_date_time, date_format, gold_star, custom_field)
+    for index, payload in prepare_payloads(entries_to_process):
+        response = post_ils_payload(payload)
         print(f"Upload response for row {index}: {response}")
 
+def bulk_upload(file_path, start_row=None, end_row=None, max_workers=upload_workers, rate=upload_rate, checkpoint_path=upload_checkpoint):
+    """Upload a sheet concurrently, skipping rows already recorded in the checkpoint file.
+
+    At most max_workers requests are in flight and at most `rate` start per second. A row is checkpointed only
+    after TQA accepts it, so rerunning after a crash or a failed row uploads just what is missing.
+    """
+    data = read_spreadsheet(file_path)
+    checkpoint = UploadCheckpoint(checkpoint_path)
+    pending = ((index, payload) for index, payload in prepare_payloads(select_rows(data, start_row, end_row)) if index not in checkpoint)
+    session = create_session(pool_size=max_workers)
+    limiter = RateLimiter(rate)
+    uploaded = failed = 0
+
+    def upload(index, payload):
+        limiter.wait()
+        try:
+            return index, post_ils_payload(payload, session), None
+        except requests.RequestException as e:
+            return index, None, e
+
+    with session, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = set()
+        while True:
+            # Keep the window full without materialising a future for every row of the sheet
+            for index, payload in pending:
+                in_flight.add(executor.submit(upload, index, payload))
+                if len(in_flight) >= max_workers * 2:
+                    break
+            if not in_flight:
+                break
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, response, error = future.result()
+                if error is not None:
+                    failed += 1
+                    print(f"[Error] Upload failed for row {index}: {error}")
+                elif response.ok:
+                    checkpoint.add(index)
+                    uploaded += 1
+                else:
+                    failed += 1
+                    print(f"[Error] Upload failed for row {index}: {response.status_code} {response.text[:200]}")
+
+    print(f"[Success] Uploaded {uploaded} incidents, {failed} failed, {len(checkpoint.done)} recorded in {checkpoint_path}.")
+    return uploaded, failed
+
+def iter_incident_pages(session, filters=None, page_size=sync_page_size, max_pages=sync_max_pages):
+    """Yield /ils one page at a time until a short, empty or repeated page comes back.
+
+    A server that ignores the paging parameters returns every incident on each request; that shows up as a page
+    longer than `page_size` or one repeating the previous page's ids, and paging stops there. `max_pages` bounds the
+    loop in any case.
+    """
+    url_process = ''.join([tqa.base_url, '/ils'])
+    previous_ids = None
+    for page in range(1, max_pages + 1):
+        params = {**(filters or {}), sync_page_param: page, sync_page_size_param: page_size}
+        response = tokens.request('GET', url_process, session=session, params=params)
+        response.raise_for_status()
+        body = response.json()
+        incidents = body.get(sync_items_key, []) if sync_items_key else body
+        page_ids = [incident.get(sync_id_field) for incident in incidents]
+        if page_ids and page_ids == previous_ids:
+            print(f"[Warning] /ils page {page} repeats page {page - 1}; the server seems to ignore '{sync_page_param}'.")
+            return
+        if incidents:
+            yield incidents
+        if len(incidents) > page_size:
+            print(f"[Warning] /ils returned {len(incidents)} incidents for a page of {page_size}; treating it as the full list.")
+            return
+        if len(incidents) < page_size:
+            return
+        previous_ids = page_ids
+    print(f"[Warning] Stopped paging /ils after {max_pages} pages; raise [Sync] max_pages if more are expected.")
+
+def _incident_to_event(incident):
+    # Scalars are stored as strings, nested values as JSON; the narrative also goes to the field the LLM stages read
+    mapping = {name: value if isinstance(value, str) else json.dumps(value) for name, value in incident.items() if value is not None}
+    mapping['Narrative'] = str(incident.get(sync_narrative_field) or '')
+    return mapping
+
+def sync_incidents(manager, site=None, since=None, filters=None, full=False, session=None):
+    """Stream new or modified ILS incidents into `event:<id>` hashes, one pipelined batch per page.
+
+    `manager` is the RedisManager from LLM-inferencing/redis_class.py; its upsert_events writes each page and keeps
+    the work index current exactly as the spreadsheet ingest does. Unless `full` is set, only incidents modified
+    after the stored high-water mark (or `since`) are requested. The high-water mark is advanced only after every
+    page has been written, so an interrupted sync is repeated.
+    """
+    r = manager.redis_conn
+    filters = dict(filters or {})
+    if site is not None:
+        filters['site'] = site
+    high_water = since or (None if full else r.get(sync_high_water_key))
+    if high_water:
+        filters[sync_modified_param] = high_water
+
+    session = session or create_session()
+    written = unchanged = 0
+    newest = high_water
+    for incidents in iter_incident_pages(session, filters):
+        events = {f"event:{incident[sync_id_field]}": _incident_to_event(incident) for incident in incidents}
+        page_written, page_unchanged = manager.upsert_events(events)
+        written += page_written
+        unchanged += page_unchanged
+
+        modified = [str(incident[sync_modified_field]) for incident in incidents if incident.get(sync_modified_field)]
+        if modified:
+            newest = max([newest, *modified]) if newest else max(modified)
+
+    if newest and newest != high_water:
+        r.set(sync_high_water_key, newest)
+    print(f"[Success] Synced incidents: {written} events written, {unchanged} unchanged, high-water mark {newest}.")
+    return written
+
 if __name__ == '__main__':
     connection_success = connect_to_tqa()
     if not connection_success:
@@ -108,3 +512,5 @@ if __name__ == '__main__':
     # process_entries(file_path)  # Process the entire sheet.
     # process_entries(file_path, start_row=5, end_row=10)  # Process a specific range.
     # process_entries(file_path, start_row=7)  # Process from a specific row to the end.
+    # bulk_upload(file_path)  # Upload the entire sheet concurrently, resuming from the checkpoint file.
+    # sync_incidents(RedisManager())  # Pull incidents modified since the last sync into Redis (see sync_incidents.py).
@@ -1,10 +1,19 @@
 
+import os
+import sys
 import pandas as pd
-from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
-from collections import Counter
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer
 import re
 from nltk.corpus import stopwords
 
+# Shared sparse top-k helper from the analytics module
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'LLM-inferencing'))
+from sparse_utils import top_k_per_row
+
+# Build the stopword set once instead of re-reading the list for every word
+STOPWORDS = frozenset(stopwords.words('english'))
+
 # Load the Excel file
 input_file_path = "New/Events_runninglist.xlsx"  # Replace with your file path
 df = pd.read_excel(input_file_path)
@@ -14,20 +23,25 @@ def preprocess_text(text):
     text = re.sub(r'[^a-zA-Z\s]', '', text, re.I|re.A)
     text = text.lower()
     text = text.strip()
-    return ' '.join([word for word in text.split() if word not in stopwords.words('english')])
+    return ' '.join([word for word in text.split() if word not in STOPWORDS])
 
 # Apply text preprocessing
 df['Preprocessed_Narratives'] = df['105.Narrative'].apply(preprocess_text)
 
+# Count unigrams through 4-grams in a single tokenization pass over the corpus
+vec = CountVectorizer(ngram_range=(1, 4))
+bag_of_words = vec.fit_transform(df['Preprocessed_Narratives']).tocsc()
+feature_names = vec.get_feature_names_out()
+sum_words = np.asarray(bag_of_words.sum(axis=0)).ravel()
+doc_freq = np.diff(bag_of_words.indptr)
+ngram_order = np.char.count(feature_names.astype(str), ' ') + 1
+
 # Extract the top 50 frequent words
-vec = CountVectorizer().fit(df['Preprocessed_Narratives'])
-bag_of_words = vec.transform(df['Preprocessed_Narratives'])
-sum_words = bag_of_words.sum(axis=0)
-words_freq = [(word, sum_words[0, idx]) for word, idx in vec.vocabulary_.items()]
-words_freq = sorted(words_freq, key=lambda x: x[1], reverse=True)
-top_50_words = [word for word, freq in words_freq[:50]]
-
-# Define context-based multi-word tags
+unigram_ids = np.flatnonzero(ngram_order == 1)
+top_50_ids = unigram_ids[np.argsort(-sum_words[unigram_ids], kind='stable')[:50]]
+top_50_words = feature_names[top_50_ids].tolist()
+
+# Define context-based multi-word tags; the keywords are matched against the lowercased narratives
 context_based_multi_word_tags = [
     {'keywords': ['dosimetric', 'error'], 'tag': 'Dosimetric Error'},
     {'keywords': ['treatment', 'plan'], 'tag': 'Treatment Plan'},
@@ -35,40 +49,33 @@ context_based_multi_word_tags = [
     # Add more context-based multi-word tags as needed
 ]
 
-# Function to extract frequent n-grams with at least min_freq occurrences
-def extract_frequent_ngrams(corpus, n, min_freq=5):
-    vec = CountVectorizer(ngram_range=(n, n), min_df=min_freq).fit(corpus)
-    bag_of_words = vec.transform(corpus)
-    sum_words = bag_of_words.sum(axis=0)
-    words_freq = [(word, sum_words[0, idx]) for word, idx in vec.vocabulary_.items()]
-    words_freq = sorted(words_freq, key=lambda x: x[1], reverse=True)
-    return [word for word, freq in words_freq]
+# Function to extract frequent n-grams found in at least min_freq narratives, most frequent first
+def extract_frequent_ngrams(n, min_freq=5):
+    ids = np.flatnonzero((ngram_order == n) & (doc_freq >= min_freq))
+    return ids[np.argsort(-sum_words[ids], kind='stable')]
 
 # Extract frequent bi-grams, tri-grams, and 4-grams
-frequent_bigrams = extract_frequent_ngrams(df['Preprocessed_Narratives'], 2)
-frequent_trigrams = extract_frequent_ngrams(df['Preprocessed_Narratives'], 3)
-frequent_fourgrams = extract_frequent_ngrams(df['Preprocessed_Narratives'], 4)
-
-# Create a combined list of single words, bi-grams, tri-grams, and four-grams for tagging
-all_possible_tags = top_50_words + [tag['tag'] for tag in context_based_multi_word_tags] + frequent_bigrams + frequent_trigrams + frequent_fourgrams
+frequent_bigram_ids = extract_frequent_ngrams(2)
+frequent_trigram_ids = extract_frequent_ngrams(3)
+frequent_fourgram_ids = extract_frequent_ngrams(4)
+frequent_bigrams = feature_names[frequent_bigram_ids].tolist()
+frequent_trigrams = feature_names[frequent_trigram_ids].tolist()
+frequent_fourgrams = feature_names[frequent_fourgram_ids].tolist()
 
-# Initialize TF-IDF Vectorizer with the combined list of all possible tags
-vectorizer = TfidfVectorizer(vocabulary=all_possible_tags, ngram_range=(1, 4))
+# Context-based tags that occur in the corpus, as column id -> tag label
+context_tag_ids = {vec.vocabulary_[' '.join(tag['keywords'])]: tag['tag'] for tag in context_based_multi_word_tags
+                   if ' '.join(tag['keywords']) in vec.vocabulary_}
 
-# Fit the TF-IDF Vectorizer to the entire corpus
-tfidf_matrix = vectorizer.fit_transform(df['Preprocessed_Narratives'].tolist())
-feature_names = vectorizer.get_feature_names_out()
+# Combined tag vocabulary, as column ids into the single count matrix
+tag_ids = np.unique(np.concatenate([top_50_ids, np.fromiter(context_tag_ids, dtype=np.int64, count=len(context_tag_ids)),
+                                    frequent_bigram_ids, frequent_trigram_ids, frequent_fourgram_ids]))
+tag_names = np.array([context_tag_ids.get(i, feature_names[i]) for i in tag_ids], dtype=object)
 
-# Function to find the top 5 most relevant tags/n-grams
-def find_top_relevant_tags(tfidf_vector):
-    feature_index = tfidf_vector.nonzero()[1]
-    tfidf_scores = zip(feature_index, [tfidf_vector[0, x] for x in feature_index])
-    sorted_scores = sorted(tfidf_scores, key=lambda x: x[1], reverse=True)
-    top_5_tags = [feature_names[i] for (i, _) in sorted_scores[:5]]
-    return ', '.join(top_5_tags)
+# Weight the selected columns with TF-IDF instead of re-tokenizing the corpus
+tfidf_matrix = TfidfTransformer().fit_transform(bag_of_words[:, tag_ids]).tocsr()
 
 # Find the top 5 most relevant tags/n-grams for each narrative
-df['Top_5_Relevant_Tags'] = [find_top_relevant_tags(tfidf_matrix[i, :]) for i in range(tfidf_matrix.shape[0])]
+df['Top_5_Relevant_Tags'] = [', '.join(tag_names[ids]) for ids in top_k_per_row(tfidf_matrix, 5)]
 
 # Save the final DataFrame to a new Excel file
 output_file_path_final = "YOUR_PATH/TaggedEventsList_Final_Optimized.xlsx"  # Replace with your desired output file path
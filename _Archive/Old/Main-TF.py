@@ -1,3 +1,8 @@
+import os
+import json
+import hashlib
+import argparse
+import joblib
 import pandas as pd
 import nltk
 from nltk.corpus import stopwords
@@ -5,11 +10,15 @@ from nltk.tokenize import word_tokenize, sent_tokenize
 from nltk.stem import WordNetLemmatizer
 from gensim.models import Word2Vec
 import numpy as np
+from scipy import sparse
 import umap.umap_ as umap
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 from collections import Counter
 from tqdm import tqdm  # Directly import the progress bar class
-from sklearn.cluster import DBSCAN
+from sklearn.cluster import DBSCAN, HDBSCAN
+from sklearn.neighbors import NearestNeighbors
 import warnings
 from numba import NumbaDeprecationWarning, NumbaPendingDeprecationWarning
 
@@ -50,49 +59,133 @@ df = df[df['preprocessed_narrative'].str.split().str.len() > 5]  # Filter out sh
 # Tokenize preprocessed narratives for Word2Vec
 df['tokens'] = df['preprocessed_narrative'].apply(word_tokenize)
 
+CORPUS_FILE = "narrative_tokens.txt"
+WORD2VEC_WORKERS = os.cpu_count() or 4
+
+def write_corpus_file(token_lists, path=CORPUS_FILE):
+    # One space separated narrative per line, the format gensim streams with corpus_file
+    with open(path, 'w', encoding='utf-8') as f:
+        for tokens in token_lists:
+            f.write(' '.join(tokens) + '\n')
+    return path
+
+def train_word2vec(corpus_file, vector_size=300, window=5, min_count=1, epochs=10, workers=WORD2VEC_WORKERS):
+    # corpus_file mode streams the corpus from disk and lets every worker train on its own slice of the file;
+    # building and training happen in this single call, so the model is trained exactly once for `epochs` passes
+    return Word2Vec(corpus_file=corpus_file, vector_size=vector_size, window=window, min_count=min_count,
+                    epochs=epochs, workers=workers)
+
+def load_or_train_word2vec(corpus_file, cache_dir="word2vec_cache"):
+    # Multi-worker training is not deterministic, so the model is cached per corpus to keep the
+    # document vectors, and with them the cached UMAP fits below, stable between runs
+    with open(corpus_file, 'rb') as f:
+        key = hashlib.sha256(f.read()).hexdigest()[:16]
+    model_path = os.path.join(cache_dir, f"{key}.model")
+    if os.path.exists(model_path):
+        return Word2Vec.load(model_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    model = train_word2vec(corpus_file)
+    model.save(model_path)
+    return model
+
 # Train a Word2Vec model
-model = Word2Vec(sentences=df['tokens'], vector_size=300, window=5, min_count=1, workers=4)
-model.train(df['tokens'], total_examples=len(df['tokens']), epochs=10)
+model = load_or_train_word2vec(write_corpus_file(df['tokens']))
 
 # Average Word2Vec vectors for each narrative
-def average_word_vectors(tokens, model, vocabulary, num_features):
-    feature_vector = np.zeros((num_features,), dtype="float64")
-    nwords = 0.
-    for word in tokens:
-        if word in vocabulary: 
-            nwords = nwords + 1.
-            feature_vector = np.add(feature_vector, model.wv[word])
-    if nwords:
-        feature_vector = np.divide(feature_vector, nwords)
-    return feature_vector
-
-df['avg_word_vec'] = df['tokens'].apply(lambda x: average_word_vectors(x, model, model.wv.index_to_key, 300))
-word_vec_array = np.array(df['avg_word_vec'].tolist())
-
-# UMAP exploration function
-def draw_umap(data, n_neighbors=15, min_dist=0.1, n_components=2, metric='euclidean', title=''):
-    fit = umap.UMAP(
-        n_neighbors=n_neighbors,
-        min_dist=min_dist,
-        n_components=n_components,
-        metric=metric
-    )
+def average_word_vectors(token_lists, wv):
+    """Mean word vector per document, built as one sparse (documents x vocabulary) product with wv.vectors."""
+    key_to_index = wv.key_to_index
+    indices = [[key_to_index[word] for word in tokens if word in key_to_index] for tokens in token_lists]
+    lengths = np.fromiter((len(ids) for ids in indices), dtype=np.int64, count=len(indices))
+    indptr = np.concatenate(([0], np.cumsum(lengths)))
+    columns = np.fromiter((i for ids in indices for i in ids), dtype=np.int64, count=indptr[-1])
+    counts = sparse.csr_matrix((np.ones(len(columns), dtype=wv.vectors.dtype), columns, indptr),
+                               shape=(len(indices), len(wv.index_to_key)))
+    # Documents with no known words keep a zero vector
+    return (counts @ wv.vectors) / np.maximum(lengths, 1)[:, np.newaxis]
+
+word_vec_array = average_word_vectors(df['tokens'], model.wv)
+df['avg_word_vec'] = list(word_vec_array)
+
+UMAP_CACHE_DIR = "umap_cache"
+
+def umap_cache_key(data, **params):
+    # Fits are keyed by their parameters and the exact input vectors
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8'))
+    digest.update(np.ascontiguousarray(data).tobytes())
+    return digest.hexdigest()[:16]
+
+def fit_umap(data, n_neighbors=15, min_dist=0.1, n_components=2, metric='euclidean', cache_dir=UMAP_CACHE_DIR):
+    """Return (projection, cache key), reusing a fit stored on disk for the same data and parameters."""
+    os.makedirs(cache_dir, exist_ok=True)
+    key = umap_cache_key(data, n_neighbors=n_neighbors, min_dist=min_dist, n_components=n_components, metric=metric)
+    projection_path = os.path.join(cache_dir, f"{key}.npy")
+    if os.path.exists(projection_path):
+        print(f"Using cached UMAP projection {key}")
+        return np.load(projection_path), key
+
+    print("Fitting UMAP...")
+    # No random_state, so UMAP is free to run its neighbour search and optimisation on every core
+    fit = umap.UMAP(n_neighbors=n_neighbors, min_dist=min_dist, n_components=n_components, metric=metric, n_jobs=-1)
     u = fit.fit_transform(data)
-    plt.figure()
-    if n_components == 2:
-        plt.scatter(u[:,0], u[:,1])
+    joblib.dump(fit, os.path.join(cache_dir, f"{key}.joblib"))
+    np.save(projection_path, u)
+    return u, key
+
+def transform_umap(data, key, cache_dir=UMAP_CACHE_DIR):
+    # Project new events with an existing fit instead of refitting the whole corpus
+    fit = joblib.load(os.path.join(cache_dir, f"{key}.joblib"))
+    return fit.transform(data)
+
+def cluster_projection(u, algorithm='dbscan', eps=0.5, min_samples=5, min_cluster_size=5):
+    if algorithm == 'hdbscan':
+        clustering = HDBSCAN(min_cluster_size=min_cluster_size, min_samples=min_samples, n_jobs=-1)
+    else:
+        clustering = DBSCAN(eps=eps, min_samples=min_samples, n_jobs=-1)
+    return clustering.fit_predict(u)
+
+def assign_clusters(u_new, u, labels, eps=0.5):
+    # New events take the label of their nearest clustered neighbour within eps, otherwise noise (-1)
+    clustered = labels != -1
+    if not clustered.any():
+        return np.full(len(u_new), -1)
+    neighbors = NearestNeighbors(n_neighbors=1, n_jobs=-1).fit(u[clustered])
+    distances, indices = neighbors.kneighbors(u_new)
+    return np.where(distances[:, 0] <= eps, labels[clustered][indices[:, 0]], -1)
+
+def plot_projection(u, labels, title, path):
+    plt.figure(figsize=(10, 8))
+    if u.shape[1] >= 2:
+        plt.scatter(u[:, 0], u[:, 1], c=labels, cmap='tab20', s=8)
     plt.title(title, fontsize=18)
-    plt.show()
-    return u
+    plt.savefig(path, dpi=150)
+    plt.close()
+    print(f"Plot saved to {path}")
 
-def main():
-    # For now, let's use the function with the parameters you initially specified
-    umap_vecs = draw_umap(word_vec_array, n_neighbors=5, min_dist=0.3, n_components=2, metric='cosine', title='UMAP with n_neighbors=5')
+def load_new_events(file_path):
+    new_df = pd.read_excel(file_path).dropna(subset=[narrative_column])
+    new_df['preprocessed_narrative'] = new_df[narrative_column].apply(preprocess)
+    new_df['tokens'] = new_df['preprocessed_narrative'].apply(word_tokenize)
+    return new_df
 
-    # Clustering using DBSCAN
-    print("Clustering data with DBSCAN...")
-    clustering = DBSCAN(eps=0.5, min_samples=5).fit(umap_vecs)
-    df['cluster_label'] = clustering.labels_
+def main():
+    parser = argparse.ArgumentParser(description="Cluster the event narratives with UMAP and DBSCAN/HDBSCAN.")
+    parser.add_argument('--algorithm', choices=['dbscan', 'hdbscan'], default='dbscan')
+    parser.add_argument('--eps', type=float, default=0.5)
+    parser.add_argument('--min-samples', type=int, default=5)
+    parser.add_argument('--min-cluster-size', type=int, default=5)
+    parser.add_argument('--n-neighbors', type=int, default=5)
+    parser.add_argument('--min-dist', type=float, default=0.3)
+    parser.add_argument('--new-events', help="spreadsheet of new events to project with the cached UMAP fit")
+    args = parser.parse_args()
+
+    # Repeated runs with the same data and UMAP parameters only repeat the clustering
+    umap_vecs, umap_key = fit_umap(word_vec_array, n_neighbors=args.n_neighbors, min_dist=args.min_dist, n_components=2, metric='cosine')
+
+    # Clustering using DBSCAN or HDBSCAN
+    print(f"Clustering data with {args.algorithm.upper()}...")
+    df['cluster_label'] = cluster_projection(umap_vecs, args.algorithm, args.eps, args.min_samples, args.min_cluster_size)
+    plot_projection(umap_vecs, df['cluster_label'], f'UMAP with n_neighbors={args.n_neighbors}', f"umap_{umap_key}_{args.algorithm}.png")
 
     # Extract Representative Keywords for Each Cluster
     def extract_keywords(cluster_texts, top_n=5):
@@ -120,6 +213,14 @@ def main():
     # Save results
     print("Saving results to Excel...")
     df.to_excel("Clustered_Events_runninglist_Word2Vec_UMAP_Tags.xlsx", index=False)
+
+    if args.new_events:
+        print("Projecting new events with the cached UMAP fit...")
+        new_df = load_new_events(args.new_events)
+        new_vecs = transform_umap(average_word_vectors(new_df['tokens'], model.wv), umap_key)
+        new_df['cluster_label'] = assign_clusters(new_vecs, umap_vecs, df['cluster_label'].to_numpy(), args.eps)
+        new_df['tags'] = new_df['cluster_label'].apply(lambda x: cluster_to_keywords.get(x, 'Noise'))
+        new_df.to_excel("Clustered_New_Events_Word2Vec_UMAP_Tags.xlsx", index=False)
     print("Done!")
 
 if __name__ == "__main__":
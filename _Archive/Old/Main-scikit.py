@@ -1,11 +1,27 @@
+import os
+import sys
+import json
+import hashlib
 import pandas as pd
 import numpy as np
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.cluster import KMeans
 from sklearn.metrics import silhouette_score
+from threadpoolctl import threadpool_limits
 from tqdm import tqdm
 
+# Silhouette is O(n^2), so it is estimated on a fixed-seed sample of at most this many rows
+SILHOUETTE_SAMPLE_SIZE = 5000
+CACHE_PATH = 'cluster_sweep_cache.json'
+
+# TF-IDF matrix shared with the sweep workers, set once per process by _init_worker
+_worker_matrix = None
+_worker_limits = None
+
 def preprocess_data(file_path):
     # Load the spreadsheet data
     data = pd.read_excel(file_path)
@@ -18,40 +34,91 @@ def tfidf_vectorization(data_cleaned):
     tfidf_matrix = tfidf_vectorizer.fit_transform(data_cleaned['105.Narrative'])
     return tfidf_matrix, tfidf_vectorizer
 
-def determine_optimal_clusters(tfidf_matrix):
-    # Using the Elbow method to find the optimal number of clusters
-    wcss = []
-    silhouette_scores = []
-    # Trying out clusters ranging from 2 to 11 (inclusive)
-    for i in tqdm(range(2, 11), desc="Determining Optimal Clusters"):
-        kmeans = KMeans(n_clusters=i, random_state=42)
-        kmeans.fit(tfidf_matrix)
-        wcss.append(kmeans.inertia_)
-        silhouette_avg = silhouette_score(tfidf_matrix, kmeans.labels_)
-        silhouette_scores.append(silhouette_avg)
+def matrix_fingerprint(tfidf_matrix):
+    # Hash of the sparse matrix contents, used to key the per-k cache
+    digest = hashlib.sha256()
+    for part in (tfidf_matrix.data, tfidf_matrix.indices, tfidf_matrix.indptr, np.array(tfidf_matrix.shape)):
+        digest.update(np.ascontiguousarray(part).tobytes())
+    return digest.hexdigest()
+
+def load_cache(path=CACHE_PATH):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+def save_cache(cache, path=CACHE_PATH):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_path, path)
+
+def _init_worker(tfidf_matrix):
+    global _worker_matrix, _worker_limits
+    _worker_matrix = tfidf_matrix
+    # The pool already runs one process per core, so each KMeans fit gets a single OpenMP/BLAS thread
+    # instead of cpu_count threads per process
+    _worker_limits = threadpool_limits(limits=1)
+
+def _score_k(k, sample_size=SILHOUETTE_SAMPLE_SIZE):
+    # Fit one k against the shared matrix and return its inertia and sampled silhouette
+    kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
+    labels = kmeans.fit_predict(_worker_matrix)
+    sample_size = min(sample_size, _worker_matrix.shape[0])
+    silhouette_avg = silhouette_score(_worker_matrix, labels, sample_size=sample_size, random_state=42)
+    return k, {'wcss': float(kmeans.inertia_), 'silhouette': float(silhouette_avg)}
+
+def determine_optimal_clusters(tfidf_matrix, k_values=range(2, 11), workers=None, cache_path=CACHE_PATH):
+    """Score each k in a process pool, reusing cached results for a matrix seen before."""
+    cache = load_cache(cache_path)
+    scores = cache.setdefault(matrix_fingerprint(tfidf_matrix), {})
+    missing = [k for k in k_values if str(k) not in scores]
+
+    if missing:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(tfidf_matrix,)) as executor:
+            futures = [executor.submit(_score_k, k) for k in missing]
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Determining Optimal Clusters"):
+                k, result = future.result()
+                scores[str(k)] = result
+                # Persist after every k so an interrupted sweep keeps its finished fits
+                save_cache(cache, cache_path)
+
+    wcss = [scores[str(k)]['wcss'] for k in k_values]
+    silhouette_scores = [scores[str(k)]['silhouette'] for k in k_values]
     return wcss, silhouette_scores
 
-def main():
-    data_cleaned = preprocess_data("Events_runninglist.xlsx")
+def write_report(k_values, wcss, silhouette_scores, report_path='cluster_sweep_report.csv'):
+    report = pd.DataFrame({'k': list(k_values), 'wcss': wcss, 'silhouette': silhouette_scores})
+    report.to_csv(report_path, index=False)
+    best = report.loc[report['silhouette'].idxmax()]
+    print(report.to_string(index=False))
+    print(f"Best silhouette at k={int(best['k'])} ({best['silhouette']:.4f}). Report written to {report_path}")
+
+def main(file_path="Events_runninglist.xlsx", plot_path='cluster_sweep.png'):
+    k_values = range(2, 11)
+    data_cleaned = preprocess_data(file_path)
     tfidf_matrix, tfidf_vectorizer = tfidf_vectorization(data_cleaned)
-    wcss, silhouette_scores = determine_optimal_clusters(tfidf_matrix)
+    wcss, silhouette_scores = determine_optimal_clusters(tfidf_matrix, k_values)
+    write_report(k_values, wcss, silhouette_scores)
 
     # Plotting results to determine optimal number of clusters
     plt.figure(figsize=(12, 5))
     plt.subplot(1, 2, 1)
-    plt.plot(range(2, 11), wcss, marker='o', linestyle='--')
+    plt.plot(k_values, wcss, marker='o', linestyle='--')
     plt.title('Elbow Method')
     plt.xlabel('Number of clusters')
     plt.ylabel('WCSS')
 
     plt.subplot(1, 2, 2)
-    plt.plot(range(2, 11), silhouette_scores, marker='o', linestyle='--')
+    plt.plot(k_values, silhouette_scores, marker='o', linestyle='--')
     plt.title('Silhouette Score')
     plt.xlabel('Number of clusters')
     plt.ylabel('Silhouette Score')
 
     plt.tight_layout()
-    plt.show()
+    plt.savefig(plot_path)
+    plt.close()
+    print(f"Plot saved to {plot_path}")
 
 if __name__ == "__main__":
-    main()
+    main(*sys.argv[1:2])
@@ -4,6 +4,7 @@ from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize
 from transformers import BertTokenizer, BertModel
 import torch
+import numpy as np
 from sklearn.cluster import DBSCAN
 
 # Step 1: Data Loading & Preprocessing
@@ -33,17 +34,24 @@ df['preprocessed_narrative'] = df[narrative_column].apply(preprocess)
 tokenizer = BertTokenizer.from_pretrained('bert-base-uncased')
 model = BertModel.from_pretrained('bert-base-uncased')
 
-def embed(text):
-    inputs = tokenizer(text, return_tensors="pt", max_length=512, truncation=True, padding="max_length")
-    with torch.no_grad():
-        output = model(**inputs)
-    return output.last_hidden_state.mean(dim=1).squeeze().numpy()
-
-df['embeddings'] = df['preprocessed_narrative'].apply(embed)
+def embed(texts, batch_size=32):
+    # Length-sorted batches padded to their longest member, pooled over real tokens only
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    embeddings = np.empty((len(texts), model.config.hidden_size), dtype=np.float32)
+    with torch.inference_mode():
+        for start in range(0, len(order), batch_size):
+            indices = order[start:start + batch_size]
+            inputs = tokenizer([texts[i] for i in indices], return_tensors="pt", max_length=512, truncation=True, padding=True)
+            hidden = model(**inputs).last_hidden_state
+            mask = inputs['attention_mask'].unsqueeze(-1).to(hidden.dtype)
+            embeddings[indices] = ((hidden * mask).sum(dim=1) / mask.sum(dim=1)).numpy()
+    return embeddings
+
+X = embed(df['preprocessed_narrative'].tolist())
+df['embeddings'] = list(X)
 
 # Step 3: Clustering
 
-X = list(df['embeddings'])
 clustering = DBSCAN(eps=0.5, min_samples=5).fit(X)
 df['cluster_label'] = clustering.labels_
 